@@ -0,0 +1,98 @@
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+)
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalizes a question so trivially different spellings of the same question map to the same key.
+
+    Args:
+        - question (str): The user's question.
+
+    Returns:
+        - str: The lowercased question with collapsed whitespace and without surrounding punctuation.
+    """
+
+    question = re.sub(r"\s+", " ", question.lower()).strip()
+
+    return question.strip(" ?!.,;:\"'")
+
+
+def request_key(tenant_id: str, query: str, chat_history: List[Dict[str, str]]) -> str:
+    """
+    Builds the coalescing key of a request from the tenant, the normalized question and the conversation history.
+
+    Args:
+        - tenant_id (str): The tenant the question is asked for.
+        - query (str): The user's question.
+        - chat_history (list of dict): The conversation history with "user" and "chatbot" entries.
+
+    Returns:
+        - str: A hex digest identifying equivalent requests.
+    """
+
+    history = [[normalize_question(entry["user"]), entry["chatbot"].strip()] for entry in chat_history]
+    payload = json.dumps([tenant_id, normalize_question(query), history], ensure_ascii=False)
+
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time - concurrent callers with the same key wait for and share the first call's result.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight: Dict[str, Future] = {}
+        self.stats = Counter()
+
+    def do(self, key: str, function: Callable, *args, **kwargs) -> Any:
+        """
+        Calls function(*args, **kwargs) unless a call with the same key is already running, in which case its result is reused.
+
+        Args:
+            - key (str): The coalescing key.
+            - function (Callable): The function computing the result.
+
+        Returns:
+            - Any: The result of the (shared) call. Exceptions are raised to every waiter.
+        """
+
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.in_flight[key] = future
+            self.stats["leader" if leader else "coalesced"] += 1
+
+        if not leader:
+            logging.info(f"Coalesced request {key[:12]} with an identical in-flight request.")
+            return future.result()
+
+        try:
+            future.set_result(function(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+        return future.result()
+
+
+# Shared by all Streamlit sessions of the process (the app script itself is re-executed on every rerun)
+query_flight = SingleFlight()
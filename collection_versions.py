@@ -0,0 +1,214 @@
+import os
+import re
+import json
+import logging
+import tempfile
+import threading
+from typing import List, Optional
+
+from config import chroma_client, collection_alias_directory
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+)
+
+_alias_cache = {}
+_alias_lock = threading.Lock()
+
+
+def _collection_names() -> List[str]:
+    # Depending on the chromadb release list_collections returns names or Collection objects
+    return [c if isinstance(c, str) else c.name for c in chroma_client.list_collections()]
+
+
+def list_versions(base_name: str) -> List[str]:
+    """
+    Lists the versioned collections ("<base_name>_vN") in Chroma.
+
+    Args:
+        - base_name (str): The collection name without version suffix.
+
+    Returns:
+        - List[str]: The collection names, ordered by ascending version.
+    """
+
+    pattern = re.compile(rf"^{re.escape(base_name)}_v(\d+)$")
+    versions = [(int(match.group(1)), name) for name in _collection_names() if (match := pattern.match(name))]
+
+    return [name for _, name in sorted(versions)]
+
+
+def next_version_name(base_name: str) -> str:
+    """
+    Returns the name of the next collection version to build.
+
+    Args:
+        - base_name (str): The collection name without version suffix.
+
+    Returns:
+        - str: "<base_name>_vN" with N one above the highest existing version.
+    """
+
+    versions = list_versions(base_name)
+    latest = int(versions[-1].rsplit("_v", 1)[1]) if versions else 0
+
+    return f"{base_name}_v{latest + 1}"
+
+
+def mark_validated(collection):
+    """
+    Marks a collection version as completely built and validated, so it may be served without an alias.
+
+    Args:
+        - collection (chromadb.Collection): The validated collection.
+    """
+
+    collection.modify(metadata={**(collection.metadata or {}), "validated": True})
+
+
+def is_validated(collection_name: str) -> bool:
+    """
+    Checks whether a collection version carries the validated marker. Versions built before the marker existed
+    (e.g. frankfurt_waste_chatbot_v1) have no "version" metadata either and count as validated.
+
+    Args:
+        - collection_name (str): The versioned collection name.
+
+    Returns:
+        - bool: False for versions still being built or left over from a failed reindex.
+    """
+
+    try:
+        metadata = chroma_client.get_collection(name=collection_name).metadata or {}
+    except Exception:
+        return False
+
+    # Every build since versioning sets "version" on creation and "validated" after validation
+    return bool(metadata.get("validated")) or "version" not in metadata
+
+
+def _alias_path(base_name: str) -> str:
+    return os.path.join(collection_alias_directory, f"{base_name}.json")
+
+
+def get_alias(base_name: str) -> Optional[str]:
+    """
+    Returns the collection version an alias points to, or None if the alias has not been set yet.
+
+    Args:
+        - base_name (str): The collection name without version suffix.
+
+    Returns:
+        - str or None: The versioned collection name.
+    """
+
+    path = _alias_path(base_name)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _alias_lock:
+        cached = _alias_cache.get(base_name)
+        if cached is None or cached[0] != mtime:
+            with open(path, encoding="utf-8") as f:
+                cached = (mtime, json.load(f)["collection"])
+            _alias_cache[base_name] = cached
+
+        return cached[1]
+
+
+def resolve_collection_name(base_name: str) -> str:
+    """
+    Resolves the alias of a collection to the versioned collection currently serving queries.
+
+    Args:
+        - base_name (str): The collection name without version suffix.
+
+    Returns:
+        - str: The name of the live collection version.
+    """
+
+    alias = get_alias(base_name)
+    if alias:
+        return alias
+
+    # No alias yet - serve the latest validated version, never one that is still being built
+    for name in reversed(list_versions(base_name)):
+        if is_validated(name):
+            return name
+
+    # Index built before versioning
+    if base_name in _collection_names():
+        return base_name
+
+    raise ValueError(f"No validated collection version found for {base_name}.")
+
+
+def seed_alias(base_name: str):
+    """
+    Points a missing alias to the collection currently served, so building the first new version cannot change what queries see.
+
+    Args:
+        - base_name (str): The collection name without version suffix.
+    """
+
+    if get_alias(base_name):
+        return
+
+    try:
+        set_alias(base_name, resolve_collection_name(base_name))
+    except ValueError:
+        # Nothing is served yet, so there is nothing to protect
+        pass
+
+
+def set_alias(base_name: str, collection_name: str):
+    """
+    Atomically points the alias of a collection to a new version. Queries pick up the new version on their next lookup.
+    Every base name has its own alias file, so indexing runs of different tenants never overwrite each other's aliases.
+
+    Args:
+        - base_name (str): The collection name without version suffix.
+        - collection_name (str): The versioned collection to serve.
+    """
+
+    os.makedirs(collection_alias_directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{base_name}.", suffix=".tmp", dir=collection_alias_directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"collection": collection_name}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, _alias_path(base_name))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    logging.info(f"Collection alias {base_name} now points to {collection_name}.")
+
+
+def garbage_collect_versions(base_name: str, keep: int):
+    """
+    Deletes old collection versions, always keeping the live version and the newest ones for rollback.
+
+    Args:
+        - base_name (str): The collection name without version suffix.
+        - keep (int): Number of newest versions to keep.
+    """
+
+    live = get_alias(base_name)
+    versions = list_versions(base_name)
+
+    for name in versions[:-keep] if keep > 0 else versions:
+        if name == live:
+            continue
+        try:
+            chroma_client.delete_collection(name=name)
+            logging.info(f"Deleted old collection version {name}.")
+        except Exception as e:
+            logging.error(f"Error deleting collection version {name}: {e}")
@@ -0,0 +1,292 @@
+import re
+import logging
+from typing import List, Set
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+)
+
+# Short German and English function words that carry no retrieval signal
+STOPWORDS = {
+    "der", "die", "das", "den", "dem", "des", "ein", "eine", "einen", "einem", "einer", "eines",
+    "und", "oder", "aber", "in", "im", "ins", "an", "am", "auf", "aus", "bei", "mit", "nach", "von",
+    "vom", "zu", "zum", "zur", "für", "ist", "sind", "wird", "werden", "kann", "können", "darf",
+    "dürfen", "soll", "muss", "was", "wie", "wo", "wer", "welche", "welcher", "welches", "ich",
+    "man", "es", "sie", "er", "wir", "ihr", "nicht", "kein", "keine", "auch", "noch", "so", "da",
+    "the", "a", "an", "and", "or", "of", "to", "is", "are", "what", "which", "where", "how", "can",
+    "i", "my", "in", "on", "for", "with", "do", "does"
+}
+
+BULLET_CHARACTERS = "•▪■●-–"
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?;:])\s+|\s+(?=[•▪■●\-–]\s)")
+TOKEN_PATTERN = re.compile(r"[a-zA-ZäöüÄÖÜß0-9]+")
+# Abbreviations common in German waste guides, whose periods (and a directly following colon) do not end a sentence
+ABBREVIATION_PATTERN = re.compile(
+    r"\b(?:z\.\s?B|d\.\s?h|u\.\s?a|s\.\s?o|s\.\s?u|o\.\s?ä|bzw|ca|ggf|evtl|inkl|exkl|usw|etc|vgl|max|min|Nr|Str|Tel|Std|Abs|Mo|Di|Mi|Do|Fr|Sa|So)\.:?"
+)
+# Inflection endings stripped before matching, so "Gemüseresten" matches "Gemüsereste"
+GERMAN_SUFFIXES = ("ern", "en", "er", "es", "em", "e", "n", "s")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimates the number of LLM tokens in a text (about four characters per token).
+
+    Args:
+        - text (str): The text to estimate.
+
+    Returns:
+        - int: The estimated number of tokens.
+    """
+
+    return (len(text) + 3) // 4
+
+
+def tokenize(text: str) -> Set[str]:
+    """
+    Lowercases a text and returns its content words without stopwords.
+
+    Args:
+        - text (str): The text to tokenize.
+
+    Returns:
+        - Set[str]: The set of content words.
+    """
+
+    return {token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS and len(token) > 1}
+
+
+def stem(token: str) -> str:
+    """
+    Strips a German inflection ending from a lowercased word, keeping at least four characters.
+
+    Args:
+        - token (str): The word to stem.
+
+    Returns:
+        - str: The stem.
+    """
+
+    for suffix in GERMAN_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            return token[:-len(suffix)]
+
+    return token
+
+
+def relevance_score(query_tokens: Set[str], text: str) -> int:
+    """
+    Counts the query words found in a text. Words match on a shared stem, so inflected forms are found
+    ("gemüseresten" and "gemüsereste"), and as part of German compounds in both directions
+    ("plastik" in "plastiktüten", "glas" for questions about "altglas").
+
+    Args:
+        - query_tokens (Set[str]): Content words of the query.
+        - text (str): The text to score.
+
+    Returns:
+        - int: The number of matched query words.
+    """
+
+    text_stems = {stem(token) for token in tokenize(text)}
+
+    def matches(query_stem):
+        return query_stem in text_stems or any(
+            (len(query_stem) >= 4 and query_stem in text_stem) or (len(text_stem) >= 5 and text_stem in query_stem)
+            for text_stem in text_stems
+        )
+
+    return sum(1 for query_token in query_tokens if matches(stem(query_token)))
+
+
+def _overlap_length(first: str, second: str, min_overlap: int) -> int:
+    """
+    Returns the length of the longest suffix of first that is also a prefix of second.
+    """
+
+    max_len = min(len(first), len(second))
+    for length in range(max_len, min_overlap - 1, -1):
+        if first.endswith(second[:length]):
+            return length
+
+    return 0
+
+
+def deduplicate_passages(passages: List[str], min_overlap: int = 20) -> List[str]:
+    """
+    Removes duplicated text between retrieved passages, e.g. the chunk overlap produced by chunk_documents.
+
+    Args:
+        - passages (List[str]): The retrieved passages in relevance order.
+        - min_overlap (int, optional): Minimum number of shared characters to count as overlap. Default is 20.
+
+    Returns:
+        - List[str]: The passages with duplicates dropped and overlapping prefixes/suffixes stripped.
+    """
+
+    deduplicated = []
+
+    for passage in passages:
+        text = passage.strip()
+
+        # Skip passages fully contained in an already kept passage
+        if not text or any(text in kept for kept in deduplicated):
+            continue
+
+        # Strip text already sent as the tail or head of a kept passage
+        for kept in deduplicated:
+            overlap = _overlap_length(kept, text, min_overlap)
+            if overlap:
+                text = text[overlap:].strip()
+            overlap = _overlap_length(text, kept, min_overlap)
+            if overlap:
+                text = text[:-overlap].strip()
+
+        if text:
+            deduplicated.append(text)
+
+    logging.debug(f"Deduplicated {len(passages)} passages into {len(deduplicated)}.")
+
+    return deduplicated
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Splits a passage into sentences and bullet points, without splitting at abbreviations like "z. B." or "Tel.".
+
+    Args:
+        - text (str): The passage to split.
+
+    Returns:
+        - List[str]: The non-empty sentences of the passage.
+    """
+
+    # Mask the punctuation of abbreviations while splitting
+    masked = ABBREVIATION_PATTERN.sub(lambda match: match.group(0).replace(".", "\x00").replace(":", "\x01"), text)
+
+    return [
+        sentence.strip().replace("\x00", ".").replace("\x01", ":")
+        for sentence in SENTENCE_SPLIT_PATTERN.split(masked) if sentence and sentence.strip()
+    ]
+
+
+def split_units(text: str) -> List[str]:
+    """
+    Splits a passage into units that are kept or dropped as a whole: single sentences, or a heading /
+    colon-terminated sentence together with the bullet points following it (e.g. "Das darf hinein: • Obst • Kaffeesatz").
+
+    Args:
+        - text (str): The passage to split.
+
+    Returns:
+        - List[str]: The units of the passage in their original order.
+    """
+
+    units = []
+    open_list = False
+
+    for sentence in split_sentences(text):
+        is_bullet = sentence[0] in BULLET_CHARACTERS
+        if units and is_bullet and open_list:
+            units[-1] = f"{units[-1]} {sentence}"
+            continue
+
+        units.append(sentence)
+        # A colon-terminated sentence or a bullet starts a list that following bullets belong to
+        open_list = sentence.endswith(":") or is_bullet
+
+    return units
+
+
+def _unit_key(unit: str) -> str:
+    return " ".join(TOKEN_PATTERN.findall(unit.lower()))
+
+
+def extract_relevant_units(query: str, units: List[str], min_units: int = 1) -> List[str]:
+    """
+    Keeps only the units of a passage that share content words with the query.
+
+    Args:
+        - query (str): The user's question.
+        - units (List[str]): The units of a passage, see split_units.
+        - min_units (int, optional): Number of best units to keep even without overlap. Default is 1.
+
+    Returns:
+        - List[str]: The relevant units in their original order.
+    """
+
+    query_tokens = tokenize(query)
+
+    if not units or not query_tokens:
+        return units
+
+    scores = [relevance_score(query_tokens, unit) for unit in units]
+    ranked = sorted(range(len(units)), key=lambda idx: scores[idx], reverse=True)
+    keep = {idx for idx in ranked if scores[idx] > 0} | set(ranked[:min_units])
+
+    return [units[idx] for idx in sorted(keep)]
+
+
+def compress_context(query: str, passages: List[str], token_budget: int = 600, full_passages: int = 1) -> List[str]:
+    """
+    Compresses retrieved passages before they are placed into the prompt by:
+        - normalizing quotes and line breaks
+        - removing overlapping passages and repeated sentences
+        - keeping the top passages whole (they were selected by embedding similarity) and, of lower-ranked
+          passages, the units relevant to the query but at least the best unit of every passage
+        - enforcing a token budget over the whole context, filtering the top passages too if they exceed it
+
+    Args:
+        - query (str): The user's question.
+        - passages (List[str]): The retrieved passages in relevance order.
+        - token_budget (int, optional): Maximum estimated number of context tokens. Default is 600.
+        - full_passages (int, optional): Number of top passages kept whole while they fit the budget. Default is 1.
+
+    Returns:
+        - List[str]: The compressed passages, most relevant first.
+    """
+
+    cleaned = [
+        re.sub(r"\s+", " ", passage.replace("'", "").replace('"', ""))
+        for passage in passages
+    ]
+
+    compressed = []
+    seen_units = set()
+    used_tokens = 0
+
+    for rank, passage in enumerate(deduplicate_passages(cleaned)):
+        if used_tokens >= token_budget:
+            break
+
+        units = []
+        for unit in split_units(passage):
+            key = _unit_key(unit)
+            if key and key not in seen_units:
+                seen_units.add(key)
+                units.append(unit)
+
+        fits = sum(estimate_tokens(unit) for unit in units) <= token_budget - used_tokens
+        if rank >= full_passages or not fits:
+            units = extract_relevant_units(query=query, units=units, min_units=1)
+
+        kept = []
+        for unit in units:
+            unit_tokens = estimate_tokens(unit)
+            if used_tokens + unit_tokens <= token_budget:
+                kept.append(unit)
+                used_tokens += unit_tokens
+
+        # Never send an empty context because the best unit alone exceeds the budget
+        if not kept and not compressed and units:
+            kept = [units[0][:token_budget * 4]]
+            used_tokens = estimate_tokens(kept[0])
+
+        if kept:
+            compressed.append(" ".join(kept))
+
+    logging.info(f"Compressed context from {sum(estimate_tokens(p) for p in passages)} to {used_tokens} estimated tokens.")
+
+    return compressed
@@ -14,3 +14,78 @@ chroma_client = chromadb.PersistentClient(
     tenant=DEFAULT_TENANT,
     database=DEFAULT_DATABASE
 )
+
+# Context compression
+context_token_budget = 600
+
+# Adaptive retrieval - squared L2 distances of the normalized embeddings (0 = identical, 2 = orthogonal)
+retrieval_initial_k = 3
+retrieval_max_k = 8
+retrieval_confident_distance = 0.5
+retrieval_max_distance = 1.4
+retrieval_distance_margin = 0.15
+
+# LLM backends in fallback order - type is one of "groq", "huggingface" or "stub"
+llm_backends = [
+    {"type": "groq", "model": "gemma-7b-it", "timeout": 20, "requests_per_minute": 30},
+    {"type": "huggingface", "model": "google/gemma-2b-it", "timeout": 30, "requests_per_minute": 10}
+]
+llm_max_retries = 2
+llm_backoff_base = 0.5
+llm_backoff_max = 8.0
+llm_hedge_default_delay = 8.0
+llm_hedge_min_samples = 20
+# Longest wait for a client-side rate limit token before falling back to the next backend (seconds)
+llm_rate_limit_wait = 2.0
+
+# Chroma collections are versioned "<base>_vN" and served through one alias file per base name
+collection_alias_directory = os.path.join(chroma_directory, "aliases")
+collection_versions_to_keep = 2
+# Upper bound of chunks per collection.add, lowered further to the client's max_batch_size
+chroma_add_batch_size = 5000
+
+# Precomputed FAQ answers - one cache file per tenant
+faq_cache_directory = dev_directory
+faq_top_observed = 20
+faq_min_count = 3
+# Observed questions are counted in memory and written to the cache at most this often (seconds)
+faq_record_flush_interval = 30.0
+
+# PDF extraction - "plain" (PyPDFLoader) or "layout" (pdfplumber, recovers tables and columns)
+pdf_extraction_mode = "layout"
+extraction_cache_directory = os.path.join(dev_directory, "extraction_cache")
+
+# Tenants (municipalities) served by one deployment - each with its own documents, collection, prompt, caches and quotas
+default_tenant = "frankfurt"
+tenant_queue_timeout = 30
+tenants = {
+    "frankfurt": {
+        "city": "Frankfurt am Main",
+        "language": "German",
+        "document_directory": document_directory,
+        "documents": [
+            {"document_name": "FES_waskommtwohinein.pdf", "category": "mülltrennung_allgemein"},
+            {"document_name": "FES_keinplastikindiebiotonne.pdf", "category": "mülltrennung_bio"},
+            {"document_name": "MW_wertstofftonne.pdf", "category": "mülltrennung_wertstoff"},
+            {"document_name": os.path.join("nicht nutzbar", "MW_050822_trenntabelle.pdf"), "category": "mülltrennung_trenntabelle", "requires_layout": True}
+        ],
+        "collection_base_name": "frankfurt_waste_chatbot",
+        "faq_questions_path": os.path.join(dev_directory, "faq_questions.json"),
+        "no_answer_response": "Dazu habe ich leider keine Informationen in meiner Wissensbasis. Bitte wende dich an die FES Frankfurt.",
+        "max_concurrent_queries": 8,
+        # Share of every LLM backend's requests_per_minute reserved for the tenant - defaults to an equal split
+        "llm_rate_share": 1.0,
+        "indexing_niceness": 10
+    }
+}
+
+# Profiling - create the toggle file to profile requests at runtime, requests slower than the threshold are written to disk
+profiling_toggle_path = os.path.join(dev_directory, "profiling.enabled")
+profiling_threshold = 5.0
+profiling_interval = 0.005
+profiling_output_directory = os.path.join(dev_directory, "profiles")
+
+# Session retrieval - cosine similarity of consecutive query vectors to reuse or extend the previous turn's passages
+session_reuse_similarity = 0.92
+session_topic_similarity = 0.6
+session_max_turns = 3
@@ -0,0 +1,249 @@
+import os
+import json
+import atexit
+import time
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from config import faq_cache_directory, faq_record_flush_interval
+from coalescing import normalize_question
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+)
+
+# Lookup hits and misses of this process, e.g. for load test reports
+lookup_stats = Counter()
+_stats_lock = threading.Lock()
+
+# Database files whose tables exist already, so connections skip the CREATE TABLE statements
+_initialized_paths = set()
+_schema_lock = threading.Lock()
+
+# Observed questions per tenant, buffered in memory and written in one transaction per flush
+_pending_questions = {}
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _create_tables(connection: sqlite3.Connection):
+    connection.execute(
+        """CREATE TABLE IF NOT EXISTS faq_answers (
+            question_key TEXT NOT NULL,
+            collection_version TEXT NOT NULL,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            refs TEXT NOT NULL,
+            sources_hash TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (question_key, collection_version)
+        )"""
+    )
+    connection.execute(
+        """CREATE TABLE IF NOT EXISTS observed_questions (
+            question_key TEXT PRIMARY KEY,
+            question TEXT NOT NULL,
+            count INTEGER NOT NULL
+        )"""
+    )
+
+
+@contextmanager
+def open_cache(tenant_id: str):
+    """
+    Opens the FAQ cache database of a tenant, creates its tables on the first open in this process and commits and closes the connection afterwards.
+    Every tenant has its own database file, so tenants never share or evict each other's entries.
+
+    Args:
+        - tenant_id (str): The tenant identifier.
+
+    Yields:
+        - sqlite3.Connection: An open connection to the FAQ cache.
+    """
+
+    path = os.path.join(faq_cache_directory, f"faq_cache_{tenant_id}.sqlite3")
+    connection = sqlite3.connect(path, timeout=10)
+
+    with _schema_lock:
+        if path not in _initialized_paths:
+            with connection:
+                _create_tables(connection)
+            _initialized_paths.add(path)
+
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def get_faq_answer(tenant_id: str, question: str, collection_version: str) -> Optional[Tuple[str, List[str]]]:
+    """
+    Looks up a precomputed answer for a question.
+
+    Args:
+        - tenant_id (str): The tenant identifier.
+        - question (str): The user's question.
+        - collection_version (str): The version of the Chroma collection the answer must be based on.
+
+    Returns:
+        - tuple or None: The answer and its references, or None if the question is not cached for this version.
+    """
+
+    with open_cache(tenant_id) as connection:
+        row = connection.execute(
+            "SELECT answer, refs FROM faq_answers WHERE question_key = ? AND collection_version = ?",
+            (normalize_question(question), collection_version)
+        ).fetchone()
+
+    with _stats_lock:
+        lookup_stats["miss" if row is None else "hit"] += 1
+
+    if row is None:
+        return None
+
+    return row[0], json.loads(row[1])
+
+
+def get_latest_entry(tenant_id: str, question: str) -> Optional[Tuple[str, List[str], str]]:
+    """
+    Returns the most recent cached answer of a question for any collection version.
+
+    Args:
+        - tenant_id (str): The tenant identifier.
+        - question (str): The question.
+
+    Returns:
+        - tuple or None: The answer, its references and the hash of its source chunks.
+    """
+
+    with open_cache(tenant_id) as connection:
+        row = connection.execute(
+            "SELECT answer, refs, sources_hash FROM faq_answers WHERE question_key = ? ORDER BY created_at DESC LIMIT 1",
+            (normalize_question(question),)
+        ).fetchone()
+
+    if row is None:
+        return None
+
+    return row[0], json.loads(row[1]), row[2]
+
+
+def put_faq_answer(tenant_id: str, question: str, collection_version: str, answer: str, references: List[str], sources_hash: str):
+    """
+    Stores a precomputed answer.
+
+    Args:
+        - tenant_id (str): The tenant identifier.
+        - question (str): The question.
+        - collection_version (str): The version of the Chroma collection the answer is based on.
+        - answer (str): The generated answer.
+        - references (List[str]): The passages used to generate the answer.
+        - sources_hash (str): Hash of the source chunks, used to detect when the answer needs a refresh.
+    """
+
+    with open_cache(tenant_id) as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO faq_answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (normalize_question(question), collection_version, question, answer,
+             json.dumps(references, ensure_ascii=False), sources_hash, time.time())
+        )
+
+
+def prune_versions(tenant_id: str, keep_version: str) -> int:
+    """
+    Deletes cached answers of all collection versions except the given one.
+
+    Args:
+        - tenant_id (str): The tenant identifier.
+        - keep_version (str): The collection version to keep.
+
+    Returns:
+        - int: The number of deleted answers.
+    """
+
+    with open_cache(tenant_id) as connection:
+        deleted = connection.execute("DELETE FROM faq_answers WHERE collection_version != ?", (keep_version,)).rowcount
+
+    logging.info(f"Pruned {deleted} cached FAQ answers of old collection versions.")
+
+    return deleted
+
+
+def record_question(tenant_id: str, question: str):
+    """
+    Counts an observed user question so the most frequent ones can be precomputed.
+    The count is buffered in memory and written with the other buffered questions once faq_record_flush_interval has passed.
+
+    Args:
+        - tenant_id (str): The tenant identifier.
+        - question (str): The user's question.
+    """
+
+    global _last_flush
+
+    with _pending_lock:
+        pending = _pending_questions.setdefault(tenant_id, {})
+        entry = pending.setdefault(normalize_question(question), [question, 0])
+        entry[1] += 1
+        due = time.monotonic() - _last_flush >= faq_record_flush_interval
+        if due:
+            _last_flush = time.monotonic()
+
+    if due:
+        flush_questions()
+
+
+def flush_questions():
+    """
+    Writes the buffered question counts of all tenants to their FAQ caches, one transaction per tenant.
+    """
+
+    with _pending_lock:
+        buffered = dict(_pending_questions)
+        _pending_questions.clear()
+
+    for tenant_id, pending in buffered.items():
+        try:
+            with open_cache(tenant_id) as connection:
+                connection.executemany(
+                    """INSERT INTO observed_questions VALUES (?, ?, ?)
+                    ON CONFLICT(question_key) DO UPDATE SET count = count + excluded.count""",
+                    [(key, question, count) for key, (question, count) in pending.items()]
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"Could not record {len(pending)} questions in FAQ cache: {e}")
+
+
+# Buffered counts must not be lost when the app shuts down
+atexit.register(flush_questions)
+
+
+def top_questions(tenant_id: str, limit: int, min_count: int) -> List[str]:
+    """
+    Returns the most frequently observed questions.
+
+    Args:
+        - tenant_id (str): The tenant identifier.
+        - limit (int): Maximum number of questions.
+        - min_count (int): Minimum number of times a question must have been asked.
+
+    Returns:
+        - List[str]: The questions, most frequent first.
+    """
+
+    flush_questions()
+
+    with open_cache(tenant_id) as connection:
+        rows = connection.execute(
+            "SELECT question FROM observed_questions WHERE count >= ? ORDER BY count DESC LIMIT ?",
+            (min_count, limit)
+        ).fetchall()
+
+    return [row[0] for row in rows]
@@ -0,0 +1,89 @@
+import sys
+import json
+import hashlib
+import logging
+from typing import List
+
+from config import faq_top_observed, faq_min_count, default_tenant
+from tenants import get_tenant
+from faq_cache import get_latest_entry, put_faq_answer, prune_versions, top_questions
+from gemma_groq_demo import load_chroma_collection, collection_version, select_passages, retrieve_and_generate
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+)
+
+
+def load_faq_questions(tenant_id: str) -> List[str]:
+    """
+    Collects the questions to precompute: the curated FAQ list followed by the most frequently observed user questions.
+
+    Args:
+        - tenant_id (str): The tenant identifier.
+
+    Returns:
+        - List[str]: The questions without duplicates.
+    """
+
+    with open(get_tenant(tenant_id)["faq_questions_path"], encoding="utf-8") as f:
+        questions = json.load(f)
+
+    questions.extend(top_questions(tenant_id=tenant_id, limit=faq_top_observed, min_count=faq_min_count))
+
+    return list(dict.fromkeys(questions))
+
+
+def hash_sources(passages: List[str]) -> str:
+    """
+    Hashes the source chunks of an answer.
+
+    Args:
+        - passages (List[str]): The passages retrieved for a question.
+
+    Returns:
+        - str: A hex digest that changes whenever the retrieved chunks change.
+    """
+
+    return hashlib.sha256(json.dumps(passages, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def warm_faq_cache(tenant_id: str):
+    """
+    Precomputes answers of the FAQ questions for the current collection version of a tenant. Answers whose source chunks
+    did not change since the last run are carried over without an LLM call, only the others are regenerated.
+
+    Args:
+        - tenant_id (str): The tenant identifier.
+    """
+
+    tenant = get_tenant(tenant_id)
+    db = load_chroma_collection(name=tenant["collection_base_name"])
+    version = collection_version(db)
+    generated, reused = 0, 0
+
+    for question in load_faq_questions(tenant_id):
+        try:
+            passages = select_passages(query=question, db=db)
+            sources_hash = hash_sources(passages)
+            previous = get_latest_entry(tenant_id=tenant_id, question=question)
+
+            if previous is not None and previous[2] == sources_hash:
+                answer, references = previous[0], previous[1]
+                reused += 1
+            else:
+                answer, references = retrieve_and_generate(tenant_id=tenant_id, query=question, chat_history=[], db=db, relevant_passages=passages)
+                generated += 1
+
+            put_faq_answer(tenant_id=tenant_id, question=question, collection_version=version, answer=answer, references=references, sources_hash=sources_hash)
+
+        except Exception as e:
+            logging.error(f"Error precomputing FAQ answer for '{question}': {e}")
+
+    prune_versions(tenant_id=tenant_id, keep_version=version)
+    logging.info(f"FAQ cache of tenant {tenant_id} warmed for collection version {version}: {generated} generated, {reused} reused.")
+
+
+if __name__ == "__main__":
+    warm_faq_cache(tenant_id=sys.argv[1] if len(sys.argv) > 1 else default_tenant)
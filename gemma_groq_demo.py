@@ -1,12 +1,31 @@
-import os
+import logging
 
 import streamlit as st
-from groq import Groq
 from langsmith import traceable
 from langsmith import Client
 
 
-from config import chroma_client
+from config import (
+    chroma_client,
+    default_tenant,
+    context_token_budget,
+    retrieval_initial_k,
+    retrieval_max_k,
+    retrieval_confident_distance,
+    retrieval_max_distance,
+    retrieval_distance_margin,
+    session_reuse_similarity,
+    session_topic_similarity,
+    session_max_turns
+)
+from compression import compress_context, tokenize
+from llm_router import get_router
+from coalescing import query_flight, request_key
+from collection_versions import resolve_collection_name
+from faq_cache import get_faq_answer, record_question
+from tenants import get_tenant, query_slot, TenantBusyError
+from profiling import profiled, profile_request, stage
+from session_retrieval import condense_query, embed_query, cosine_similarity, remember_turn, count_retrieval
 
 from dotenv import load_dotenv
 
@@ -14,28 +33,35 @@ load_dotenv()
 
 #-----------STATE: Documents are preprocessed, chunked, embedded and stored in Chroma vector store.
 
-client = Client()
-url = next(client.list_runs(project_name="default")).url
-print(url)
-
 @traceable
 def load_chroma_collection(name):
     """
-    Loads an existing Chroma collection from the specified path with the given name.
+    Loads the live version of a Chroma collection by resolving its alias.
 
     Parameters:
-    - path (str): The path where the Chroma database is stored.
-    - name (str): The name of the collection within the Chroma database.
+    - name (str): The alias (base name without version suffix) of the collection within the Chroma database.
 
     Returns:
     - chromadb.Collection: The loaded Chroma Collection.
     """
-    db = chroma_client.get_collection(name=name) #embedding_function=GeminiEmbeddingFunction())
+    db = chroma_client.get_collection(name=resolve_collection_name(name)) #embedding_function=GeminiEmbeddingFunction())
 
     return db
 
+def collection_version(db):
+    """
+    Returns the version of a Chroma collection, set at indexing time. Used to key precomputed FAQ answers.
+
+    Parameters:
+    - db (chromadb.Collection): The Chroma Collection.
+
+    Returns:
+    - str: The version stored in the collection metadata, or the collection name for collections without one.
+    """
+    return (db.metadata or {}).get("version", db.name)
+
 @traceable
-def get_relevant_passages(query, db, n_results):
+def get_relevant_passages(query, db, n_results, query_embedding=None):
   """
   Retrieves the most relevant documents from the Chroma collection based on the given query.
 
@@ -43,50 +69,144 @@ def get_relevant_passages(query, db, n_results):
   - query (str): The search query used to find relevant documents in the collection.
   - db (chromadb.Collection): The Chroma Collection from which to retrieve documents.
   - n_results (int): The number of top results to return based on relevance.
+  - query_embedding (list, optional): A precomputed vector of the query, which is then not embedded again.
 
   Returns:
-  - list: The most relevant documents corresponding to the query.
+  - tuple: A tuple containing:
+      - list: The most relevant documents corresponding to the query.
+      - list: The distance of each document to the query (lower is closer).
   """
-  passages = db.query(query_texts=[query], n_results=n_results)['documents'][0]
+  if query_embedding is not None:
+    results = db.query(query_embeddings=[query_embedding], n_results=n_results, include=["documents", "distances"])
+  else:
+    results = db.query(query_texts=[query], n_results=n_results, include=["documents", "distances"])
   
+  return results['documents'][0], results['distances'][0]
+
+@traceable
+def select_passages(query, db, query_embedding=None):
+  """
+  Retrieves passages with an adaptive depth based on the Chroma distances:
+    - no passages if even the closest hit is too far away (the question is not covered by the knowledge base)
+    - a single passage if the closest hit is a confident match
+    - otherwise all passages close to the best hit, widening the search while the scores stay flat
+
+  Parameters:
+  - query (str): The search query used to find relevant documents in the collection.
+  - db (chromadb.Collection): The Chroma Collection from which to retrieve documents.
+  - query_embedding (list, optional): A precomputed vector of the query.
+
+  Returns:
+  - list: The selected passages, most relevant first.
+  """
+  # Embed once - every widening pass reuses the vector instead of embedding the query text again
+  if query_embedding is None:
+    query_embedding = embed_query(query)
+
+  n_results = retrieval_initial_k
+
+  while True:
+    passages, distances = get_relevant_passages(query=query, db=db, n_results=n_results, query_embedding=query_embedding)
+
+    if not passages or distances[0] > retrieval_max_distance:
+      return []
+    if distances[0] <= retrieval_confident_distance:
+      return passages[:1]
+
+    close_passages = [
+      passage for passage, distance in zip(passages, distances)
+      if distance <= distances[0] + retrieval_distance_margin
+    ]
+
+    # Flat scores - every result is about as close as the best one, so look further
+    if len(close_passages) == n_results and n_results < retrieval_max_k:
+      n_results = min(n_results * 2, retrieval_max_k)
+      continue
+
+    return close_passages
+
+@traceable
+def select_session_passages(query, query_embedding, db, retrieval_state):
+  """
+  Retrieves passages for a turn of a chat session, reusing the retrieval of previous turns:
+    - if the query vector is nearly identical to the previous turn's and the query adds no new content words, the previous passages are reused without a search
+    - if the topic has not changed, a shallow search extends the previous passages
+    - otherwise a full adaptive search (select_passages) runs
+  The turn itself is stored by the caller (remember_turn), so every session sharing a coalesced answer updates its own state.
+
+  Parameters:
+  - query (str): The standalone query of the turn, see condense_query.
+  - query_embedding (list): The vector of the standalone query.
+  - db (chromadb.Collection): The Chroma Collection from which to retrieve documents.
+  - retrieval_state (dict): The session's retrieval state with the query vectors and passages of previous turns.
+
+  Returns:
+  - list: The selected passages, most relevant first.
+  """
+  turns = retrieval_state.get("turns", [])
+
+  # Turns answered from the FAQ cache are stored without a vector
+  if turns and turns[-1]["vector"] is None:
+    turns[-1]["vector"] = embed_query(turns[-1]["query"])
+
+  similarity = cosine_similarity(query_embedding, turns[-1]["vector"]) if turns else 0.0
+  # The condensed query repeats the previous questions, so a high similarity alone does not mean nothing new was asked
+  adds_content = bool(turns) and not tokenize(query) <= tokenize(turns[-1]["query"])
+
+  if turns and similarity >= session_reuse_similarity and not adds_content:
+    passages = list(turns[-1]["passages"])
+    count_retrieval("reuse")
+    logging.info(f"Reusing previous retrieval (similarity {similarity:.2f}).")
+
+  elif turns and similarity >= session_topic_similarity:
+    new_passages, distances = get_relevant_passages(query=query, db=db, n_results=retrieval_initial_k, query_embedding=query_embedding)
+    new_passages = [passage for passage, distance in zip(new_passages, distances) if distance <= retrieval_max_distance]
+    passages = list(dict.fromkeys(new_passages + turns[-1]["passages"]))[:retrieval_max_k]
+    count_retrieval("extend")
+    logging.info(f"Extended previous retrieval with {len(new_passages)} passages (similarity {similarity:.2f}).")
+
+  else:
+    passages = select_passages(query=query, db=db, query_embedding=query_embedding)
+    count_retrieval("full")
+
   return passages
 
 @traceable
-def define_prompt(query, chat_history, relevant_passages):
+def define_prompt(query, chat_history, relevant_passages, tenant, standalone_query=None):
   """
   Constructs a prompt for the chatbot by combining the user's query with relevant passages and the conversation history.
+  The passages are compressed (deduplicated, reduced to relevant sentences, capped by a token budget) to keep the prompt short.
 
   Parameters:
   - query (str): The user's search query or question.
   - chat history (list of dict): A list of dictionaries representation conversation history, containing "user" and "chatbot".
   - relevant_passages (list): A list of relevant document passages retrieved from the Chroma collection.
+  - tenant (dict): The configuration of the tenant (city and default language) the chatbot answers for.
+  - standalone_query (str, optional): The condensed query of a follow-up question, used to pick the relevant sentences. Default is the query itself.
 
   Returns:
   - str: A formatted prompt string that incorporates the user's query, relevant passages and conversation history.
   """
-  processed_passages = [
-    passage.replace("'", "").replace('"', "").replace("\n", " ")
-    for passage in relevant_passages
-  ]
+  processed_passages = compress_context(query=standalone_query or query, passages=relevant_passages, token_budget=context_token_budget)
 
   # Combine previous history with new query
   history_text = ""
   for entry in chat_history:
       history_text += f"User: {entry['user']}\nBot: {entry['chatbot']}\n"
 
+  context_text = "\n".join(f"- {passage}" for passage in processed_passages)
+
   prompt = (
-  f"""You are a knowledgeable and helpful chatbot specialized in waste management for residents of Frankfurt am Main. 
-  You will answer questions in the same language in which they are asked. Use the provided context to inform your answer, 
-  but do not rely on it verbatim—rephrase and integrate the information naturally into your response. If the context does not 
-  directly apply to the question, generate an answer based on your understanding and provide helpful, relevant information. 
-  Always aim to be comprehensive, clear, and accurate, reflecting local regulations and practices related to waste management 
-  in Frankfurt am Main.
+  f"""You are a helpful waste management chatbot for residents of {tenant['city']}. Answer in the language of the question 
+  (default {tenant['language']}), clearly and accurately, rephrasing the context in your own words. If the context does not apply, 
+  answer from your own knowledge of local waste regulations.
      
-  Here is the conversation so far:
+  CONVERSATION:
   {history_text}
         
   QUESTION: '{query}'
-  CONTEXT: '{processed_passages}'
+  CONTEXT:
+  {context_text}
 
   ANSWER:
   """
@@ -95,41 +215,109 @@ def define_prompt(query, chat_history, relevant_passages):
   return prompt
 
 @traceable
-def query_groq_api(query, chat_history):
+def retrieve_and_generate(tenant_id, query, chat_history, retrieval_state=None, standalone_query=None, query_embedding=None, db=None, relevant_passages=None):
     """
-    Queries the GROQ API with the constructed prompt to generate a response.
+    Retrieves relevant passages from the tenant's collection and generates the answer with the LLM. The LLM call goes
+    through the LLM router, which uses Groq first and falls back to (or hedges with) the other configured backends.
+    The work holds one of the tenant's concurrent query slots.
 
     Parameters:
+    - tenant_id (str): The tenant (municipality) the question is asked for.
     - query (str): The user's search query or question.
     - chat history (list of dict): A list of dictionaries representation conversation history, containing "user" and "chatbot".
+    - retrieval_state (dict, optional): The session's retrieval state, see select_session_passages. Without it every turn is retrieved from scratch.
+    - standalone_query (str, optional): The condensed query of the turn. Computed from the query and chat history if missing.
+    - query_embedding (list, optional): The vector of the standalone query. Computed if missing.
+    - db (chromadb.Collection, optional): The tenant's live collection if the caller has loaded it already.
+    - relevant_passages (list, optional): Passages the caller has retrieved already, which skips the retrieval.
 
     Returns:
     - tuple: A tuple containing:
         - str: The generated answer from the chatbot.
         - list: The list of relevant document passages used to generate the answer.
     """
-    client = Groq(
-        api_key=os.getenv("GROQ_API_KEY")
-    )
-    
-    # Perform similarity search to construct query and context 
-    db = load_chroma_collection(name="frankfurt_waste_chatbot_v1")
-    relevant_passages = get_relevant_passages(query=query,db=db,n_results=3)
-    
-    prompt = define_prompt(query=query, chat_history=chat_history, relevant_passages=relevant_passages)
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ], 
-        model="gemma-7b-it"
-    )
-    answer = chat_completion.choices[0].message.content
+    tenant = get_tenant(tenant_id)
+
+    with query_slot(tenant_id):
+        # Perform similarity search to construct query and context 
+        if db is None and relevant_passages is None:
+            with stage("collection_load"):
+                db = load_chroma_collection(name=tenant["collection_base_name"])
+        with stage("retrieval"):
+            if relevant_passages is not None:
+                standalone_query = standalone_query or query
+            elif retrieval_state is None:
+                standalone_query = standalone_query or query
+                relevant_passages = select_passages(query=standalone_query, db=db, query_embedding=query_embedding)
+            else:
+                standalone_query = standalone_query or condense_query(query=query, chat_history=chat_history)
+                if query_embedding is None:
+                    query_embedding = embed_query(standalone_query)
+                relevant_passages = select_session_passages(query=standalone_query, query_embedding=query_embedding, db=db, retrieval_state=retrieval_state)
+
+        # Skip the LLM if the knowledge base does not cover the question
+        if not relevant_passages:
+            return tenant["no_answer_response"], relevant_passages
+        
+        with stage("prompt"):
+            prompt = define_prompt(query=query, chat_history=chat_history, relevant_passages=relevant_passages, tenant=tenant, standalone_query=standalone_query)
+        with stage("llm"):
+            answer = get_router().complete(prompt, tenant_id=tenant_id)
 
     return answer, relevant_passages
 
+@traceable
+@profiled("query_groq_api")
+def query_groq_api(query, chat_history, tenant_id=default_tenant, retrieval_state=None):
+    """
+    Answers a question. Questions without conversation history are first looked up in the tenant's precomputed FAQ cache.
+    Otherwise concurrent identical questions (same tenant, normalized text and conversation history) are coalesced into
+    a single retrieval and LLM call whose answer is shared by all waiting callers.
+
+    Parameters:
+    - query (str): The user's search query or question.
+    - chat history (list of dict): A list of dictionaries representation conversation history, containing "user" and "chatbot".
+    - tenant_id (str, optional): The tenant (municipality) the question is asked for. Default is default_tenant from config.
+    - retrieval_state (dict, optional): The session's retrieval state, reused and extended across the turns of a session.
+      Every caller stores its turn in its own state, also when the answer comes from the FAQ cache or a coalesced request.
+
+    Returns:
+    - tuple: A tuple containing:
+        - str: The generated answer from the chatbot.
+        - list: The list of relevant document passages used to generate the answer.
+    """
+    tenant = get_tenant(tenant_id)
+
+    with stage("collection_load"):
+        db = load_chroma_collection(name=tenant["collection_base_name"])
+
+    if not chat_history:
+        with stage("faq_lookup"):
+            cached = get_faq_answer(tenant_id=tenant_id, question=query, collection_version=collection_version(db))
+        if cached is not None:
+            if retrieval_state is not None:
+                # The vector is only computed if a follow-up question needs it
+                remember_turn(retrieval_state, query=query, vector=None, passages=cached[1], max_turns=session_max_turns)
+            return cached
+
+    standalone_query, query_embedding = query, None
+    if retrieval_state is not None:
+        with stage("condense"):
+            standalone_query = condense_query(query=query, chat_history=chat_history)
+            query_embedding = embed_query(standalone_query)
+
+    key = request_key(tenant_id=tenant_id, query=query, chat_history=chat_history)
+    answer, relevant_passages = query_flight.do(
+        key, retrieve_and_generate,
+        tenant_id=tenant_id, query=query, chat_history=list(chat_history), retrieval_state=retrieval_state,
+        standalone_query=standalone_query, query_embedding=query_embedding, db=db
+    )
+
+    if retrieval_state is not None:
+        remember_turn(retrieval_state, query=standalone_query, vector=query_embedding, passages=relevant_passages, max_turns=session_max_turns)
+
+    return answer, list(relevant_passages)
+
 @traceable
 def get_user_input():
     """
@@ -141,48 +329,85 @@ def get_user_input():
     return st.text_input("Ask a question:")
 
 @traceable
-def generate_answer(user_question):
+@profiled("generate_answer")
+def generate_answer(user_question, tenant_id):
     """
     Generates answers by calling the GROQ API and updates the chat history and relevant references in a Streamlit application.
 
     Parameters:
     - user_question (str): The user's inputted query or question.
+    - tenant_id (str): The tenant (municipality) selected for the session.
 
     Returns:
     - None
     """
-    with st.spinner("Generating answer..."):
-        answer, relevant_passages = query_groq_api(query=user_question, chat_history=st.session_state.chat_history)
+    # Only opening questions are counted - follow-ups make no sense without the history and the FAQ cache is never
+    # consulted for them. Streamlit reruns the script with the same input on every interaction, so count each only once.
+    if not st.session_state.chat_history and st.session_state.get("recorded_question") != user_question:
+        record_question(tenant_id=tenant_id, question=user_question)
+        st.session_state.recorded_question = user_question
+
+    try:
+        with st.spinner("Generating answer..."):
+            answer, relevant_passages = query_groq_api(
+                query=user_question,
+                chat_history=st.session_state.chat_history,
+                tenant_id=tenant_id,
+                retrieval_state=st.session_state.retrieval_state
+            )
+    except TenantBusyError:
+        st.warning("The chatbot is very busy right now. Please try again in a moment.")
+        return
                
     st.session_state.chat_history.append({"user": user_question, "chatbot": answer})
     
-    col1, col2 = st.columns([2, 1])
+    with stage("render"):
+        col1, col2 = st.columns([2, 1])
 
-    with col1:
-        st.write("### Chat History")
-        for entry in st.session_state.chat_history:
-            st.write(f"**User:** {entry['user']}")
-            st.write(f"**Chatbot:** {entry['chatbot']}")
-        
-    with col2:      
-        st.write("### References Provided:")
-        for i, passage in enumerate(relevant_passages, start=1):
-            st.write(f"**Reference {i}:** {passage}")
+        with col1:
+            st.write("### Chat History")
+            for entry in st.session_state.chat_history:
+                st.write(f"**User:** {entry['user']}")
+                st.write(f"**Chatbot:** {entry['chatbot']}")
+            
+        with col2:      
+            st.write("### References Provided:")
+            for i, passage in enumerate(relevant_passages, start=1):
+                st.write(f"**Reference {i}:** {passage}")
             
 # Main function to run the Streamlit app
 if __name__ == "__main__":
-    st.set_page_config(layout="wide")
-    st.title("Frankfurt Waste Chatbot")
-    st.write("Hello, I am a chatbot based on the LLM Gemma of Google. Ask me any questions about waste management in Frankfurt!")
+    # Profiles the whole rerun, so slow requests show the Streamlit overhead next to the answer stages
+    with profile_request("streamlit_run"):
+        st.set_page_config(layout="wide")
+
+        # Print the latest LangSmith run for debugging - kept out of module import so other tools can import the query path
+        client = Client()
+        url = next(client.list_runs(project_name="default")).url
+        print(url)
+
+        # The tenant is selected by the URL, e.g. ?tenant=frankfurt
+        tenant_id = st.query_params.get("tenant", default_tenant)
+        try:
+            tenant = get_tenant(tenant_id)
+        except ValueError:
+            st.error(f"Unknown municipality '{tenant_id}'. Please check the link you used to open the chatbot.")
+            st.stop()
+
+        st.title(f"{tenant['city']} Waste Chatbot")
+        st.write(f"Hello, I am a chatbot based on the LLM Gemma of Google. Ask me any questions about waste management in {tenant['city']}!")
   
-    # Initialize session state for chat history if not already done
-    if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
+        # Initialize session state for chat history if not already done
+        if 'chat_history' not in st.session_state:
+            st.session_state.chat_history = []
+
+        # Query vectors and passages of previous turns, reused for follow-up questions
+        if 'retrieval_state' not in st.session_state:
+            st.session_state.retrieval_state = {}
     
-    # User input for the query
-    user_question = get_user_input()
+        # User input for the query
+        user_question = get_user_input()
     
-    if user_question:
-        # Process the query and update the chat history
-       generate_answer(user_question=user_question)
-
+        if user_question:
+            # Process the query and update the chat history
+            generate_answer(user_question=user_question, tenant_id=tenant_id)
@@ -1,6 +1,7 @@
 import os
 import sys
 import logging
+from datetime import datetime
 from typing import List
 
 from sentence_transformers import SentenceTransformer
@@ -9,7 +10,10 @@ from langchain.schema import Document
 from chromadb import Client
 
 from loading import preprocess_docs
-from config import dev_directory, chroma_directory, embedding_model_name, chroma_client
+from config import chroma_directory, embedding_model_name, chroma_client, collection_versions_to_keep, chroma_add_batch_size, default_tenant
+from tenants import get_tenant
+from profiling import profile_request, stage
+from collection_versions import next_version_name, seed_alias, set_alias, mark_validated, garbage_collect_versions
 
 # Configure logging
 logging.basicConfig(
@@ -74,67 +78,135 @@ def embed_documents(documents: List[Document]) -> List[List[float]]:
 
     return embeddings
 
+def validate_collection(collection, documents: List[Document], embeddings: List[List[float]]):
+    """
+    Checks a freshly built collection before it is served: the number of stored chunks and a smoke query.
+
+    Args:
+        - collection (chromadb.Collection): The collection to validate.
+        - documents (List[Document]): The document chunks that were stored.
+        - embeddings (List[List[float]]): The embeddings that were stored.
+
+    Raises:
+        - ValueError: If the collection is incomplete or the smoke query fails.
+    """
+    
+    count = collection.count()
+    if count != len(documents):
+        raise ValueError(f"Collection {collection.name} contains {count} chunks, expected {len(documents)}.")
+
+    # A stored embedding must find its own chunk, and a text query must return results
+    if collection.query(query_embeddings=[embeddings[0]], n_results=1)["ids"][0] != ["doc_0"]:
+        raise ValueError(f"Smoke query on collection {collection.name} did not return the expected chunk.")
+    if not collection.query(query_texts=[documents[0].page_content], n_results=1)["ids"][0]:
+        raise ValueError(f"Text smoke query on collection {collection.name} returned no results.")
+
+    logging.info(f"Collection {collection.name} validated with {count} chunks.")
+
 def store_embeddings_in_chroma(documents: List[Document], embeddings: List[List[float]], collection_name: str):
     """
-    Stores embeddings in a Chroma vector store.
+    Stores embeddings in a new version of a Chroma collection without interrupting queries:
+        - pins the alias to the live version before building
+        - builds "<collection_name>_vN" next to the live version, in batches of at most the client's max_batch_size
+        - validates chunk count and a smoke query and marks the version as validated
+        - atomically points the collection alias to the new version
+        - deletes old versions beyond collection_versions_to_keep
 
     Args:
         - documents (List[Document]): A list of document chunks from Documents Class.
         - embeddings (List[List[float]]): Embeddings for each document chunk.
-        - collection_name (str): Name of the Chroma collection.
+        - collection_name (str): Base name (alias) of the Chroma collection.
+
+    Returns:
+        - chromadb.Collection: The new live collection version.
     """
     
+    seed_alias(collection_name)
+    version_name = next_version_name(collection_name)
+    batch_size = min(chroma_add_batch_size, getattr(chroma_client, "max_batch_size", None) or chroma_add_batch_size)
+    created = False
+
     try:
-        chroma_client.reset()
-        logging.debug(f"Chroma database resetted.")
-        
-        collection = chroma_client.create_collection(name=collection_name) #embedding_function
-        logging.info("Collection created in Chroma.")
-
-        for idx, doc in enumerate(documents):
-            metadata = doc.metadata or {}
+        # The version keys precomputed FAQ answers to the index they were generated from
+        collection = chroma_client.create_collection(
+            name=version_name,
+            metadata={"version": datetime.now().strftime("%Y%m%d%H%M%S")}
+        ) #embedding_function
+        created = True
+        logging.info(f"Collection {version_name} created in Chroma.")
+
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
             collection.add(
-                ids=[f"doc_{idx}"],
-                embeddings=[embeddings[idx]],
-                metadatas=[metadata],
-                documents=[doc.page_content]
+                ids=[f"doc_{idx}" for idx in range(start, start + len(batch))],
+                embeddings=embeddings[start:start + batch_size],
+                metadatas=[doc.metadata or {} for doc in batch],
+                documents=[doc.page_content for doc in batch]
             )
         logging.info("Embeddings stored in Chroma.")
+
+        validate_collection(collection, documents, embeddings)
+        mark_validated(collection)
     
     except Exception as e:
-        logging.error(f"Error storing embeddings in Chroma: {e}")
+        logging.error(f"Error storing embeddings in Chroma, keeping the live collection: {e}")
+        # A concurrent reindex may own this name (create_collection failed because it exists) - never delete its collection
+        if created:
+            try:
+                chroma_client.delete_collection(name=version_name)
+            except Exception:
+                pass
+        raise
+
+    set_alias(collection_name, version_name)
+    garbage_collect_versions(collection_name, keep=collection_versions_to_keep)
     
     return collection
 
 if __name__ == "__main__":
     
-    # Define document paths
-    documents = [
-        {"document_name": "FES_waskommtwohinein.pdf", "category": "mülltrennung_allgemein"},
-        {"document_name": "FES_keinplastikindiebiotonne.pdf", "category": "mülltrennung_bio"},
-        {"document_name": "MW_wertstofftonne.pdf", "category": "mülltrennung_wertstoff"}
-    ]
+    # Index the documents of one tenant: python indexing.py [tenant_id]
+    tenant_id = sys.argv[1] if len(sys.argv) > 1 else default_tenant
+    tenant = get_tenant(tenant_id)
 
-    try:
-        # Preprocess raw documents
-        preprocessed_docs = preprocess_docs(documents=documents, root_dir=dev_directory)
-        logging.info("Preprocessing completed.")
-
-        # Split preprocessed documents into chunks
-        chunked_documents = chunk_documents(preprocessed_docs=preprocessed_docs)
-
-        # Embed chunks
-        embeddings = embed_documents(chunked_documents)
-        
-        # Check if documents and embeddings match
-        if len(chunked_documents) != len(embeddings):
-            logging.error("Mismatch between number of documents and embeddings.")
+    # Lower the CPU priority so a large reindex does not slow down live queries of other tenants
+    if hasattr(os, "nice"):
+        os.nice(tenant["indexing_niceness"])
+
+    # Every indexing run writes its profile and stage breakdown for offline analysis
+    with profile_request(f"indexing_{tenant_id}", force=True, threshold=0):
+        try:
+            # Preprocess raw documents
+            with stage("preprocess"):
+                preprocessed_docs = preprocess_docs(documents=tenant["documents"], root_dir=tenant["document_directory"])
+            logging.info("Preprocessing completed.")
+
+            # Split preprocessed documents into chunks
+            with stage("chunk"):
+                chunked_documents = chunk_documents(preprocessed_docs=preprocessed_docs)
+
+            # Embed chunks
+            with stage("embed"):
+                embeddings = embed_documents(chunked_documents)
+            
+            # Check if documents and embeddings match
+            if len(chunked_documents) != len(embeddings):
+                logging.error("Mismatch between number of documents and embeddings.")
+                sys.exit(1)
+
+            # Store embeddings in Chroma
+            with stage("store"):
+                collection = store_embeddings_in_chroma(chunked_documents, embeddings, tenant["collection_base_name"])
+            
+        except Exception as e:
+            logging.error(f"Error in main execution: {e}")
             sys.exit(1)
 
-        # Store embeddings in Chroma
-        collection_name = "frankfurt_waste_chatbot_v1"
-        collection = store_embeddings_in_chroma(chunked_documents, embeddings, collection_name)
-        
-    except Exception as e:
-        logging.error(f"Error in main execution: {e}")
-        sys.exit(1)
+        try:
+            # Precompute answers of the FAQ questions for the new index - imported here as it loads the chatbot app
+            with stage("faq_warmup"):
+                from faq_warmup import warm_faq_cache
+                warm_faq_cache(tenant_id=tenant_id)
+            
+        except Exception as e:
+            logging.error(f"Error warming FAQ cache: {e}")
@@ -0,0 +1,456 @@
+import os
+import time
+import random
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from typing import List, Dict, Optional
+
+import requests
+from dotenv import load_dotenv
+
+from config import (
+    tenants,
+    default_tenant,
+    llm_backends,
+    llm_max_retries,
+    llm_backoff_base,
+    llm_backoff_max,
+    llm_hedge_default_delay,
+    llm_hedge_min_samples,
+    llm_rate_limit_wait
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+)
+
+load_dotenv()
+
+# How often a waiting request checks whether a queued backend call has started, so the hedge clock starts with the call
+HEDGE_START_POLL_INTERVAL = 0.05
+
+
+class LLMRouterError(Exception):
+    """Raised when no backend was able to answer a prompt."""
+
+
+class RateLimitedError(Exception):
+    """Raised by a backend when the provider rejects a request with HTTP 429."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Decides whether a failed backend call is worth retrying: timeouts, connection errors, HTTP 5xx and 429.
+    Permanent errors like 400 (bad request) or 401 (invalid API key) fall back to the next backend right away.
+
+    Args:
+        - error (Exception): The error raised by the backend.
+
+    Returns:
+        - bool: True if the same backend may succeed on a retry.
+    """
+
+    if isinstance(error, (RateLimitedError, TimeoutError, ConnectionError, requests.Timeout, requests.ConnectionError)):
+        return True
+
+    # requests.HTTPError carries the response, the Groq client's APIStatusError the status code itself
+    status_code = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status_code is not None:
+        return status_code >= 500 or status_code == 429
+
+    # Timeouts and connection errors of the Groq client have no status code
+    return type(error).__name__ in ("APITimeoutError", "APIConnectionError")
+
+
+class TokenBucket:
+    """
+    Client-side token bucket limiting the request rate to a backend, so bursts are smoothed out instead of triggering 429s.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout: float) -> bool:
+        """
+        Takes one token, waiting at most timeout seconds for one to become available.
+
+        Args:
+            - timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+            - bool: True if a token was taken, False if the wait would exceed the timeout.
+        """
+
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_time = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+
+            if now + wait_time > deadline:
+                return False
+            time.sleep(wait_time)
+
+    def pause(self, seconds: float):
+        """
+        Blocks the bucket after the provider signalled a rate limit and drops the accumulated burst.
+
+        Args:
+            - seconds (float): Number of seconds before the next request is allowed.
+        """
+
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+class LLMBackend(ABC):
+    """
+    Base class of an LLM backend with its own timeout, per-tenant rate limits and latency history.
+    """
+
+    def __init__(self, name: str, model: str, timeout: float, requests_per_minute: float, burst: int = 5):
+        self.name = name
+        self.model = model
+        self.timeout = timeout
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.latencies = deque(maxlen=200)
+        self.lock = threading.Lock()
+
+    def bucket(self, tenant_id: str) -> TokenBucket:
+        """
+        Returns the token bucket of a tenant, holding the tenant's llm_rate_share of the backend's rate limit,
+        so a traffic spike of one tenant cannot use up the provider quota of all tenants.
+
+        Args:
+            - tenant_id (str): The tenant identifier.
+
+        Returns:
+            - TokenBucket: The tenant's bucket for this backend.
+        """
+
+        with self.lock:
+            if tenant_id not in self.buckets:
+                share = tenants.get(tenant_id, {}).get("llm_rate_share", 1 / len(tenants))
+                self.buckets[tenant_id] = TokenBucket(
+                    requests_per_minute=self.requests_per_minute * share,
+                    burst=max(1, round(self.burst * share))
+                )
+
+            return self.buckets[tenant_id]
+
+    def pause(self, seconds: float):
+        """
+        Pauses the buckets of all tenants, since the provider's rate limit applies to the whole API key.
+
+        Args:
+            - seconds (float): Number of seconds before the next request is allowed.
+        """
+
+        with self.lock:
+            buckets = list(self.buckets.values())
+
+        for bucket in buckets:
+            bucket.pause(seconds)
+
+    def record_latency(self, seconds: float):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def p95_latency(self) -> Optional[float]:
+        """
+        Returns the 95th percentile of the recent successful call latencies, or None while there are too few samples.
+        """
+
+        with self.lock:
+            if len(self.latencies) < llm_hedge_min_samples:
+                return None
+            ordered = sorted(self.latencies)
+
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    @abstractmethod
+    def complete(self, prompt: str) -> str:
+        """
+        Generates an answer for a prompt, raising RateLimitedError when the provider rejects the request with HTTP 429.
+        """
+
+
+class GroqBackend(LLMBackend):
+    """Chat completion through the Groq API."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.client = None
+
+    def complete(self, prompt: str) -> str:
+        from groq import Groq, RateLimitError
+
+        if self.client is None:
+            # Retries are handled by the router
+            self.client = Groq(api_key=os.getenv("GROQ_API_KEY"), timeout=self.timeout, max_retries=0)
+
+        try:
+            chat_completion = self.client.chat.completions.create(
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                model=self.model
+            )
+        except RateLimitError as e:
+            retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+            raise RateLimitedError(str(e), retry_after=float(retry_after) if retry_after else None)
+
+        return chat_completion.choices[0].message.content
+
+
+class HuggingFaceBackend(LLMBackend):
+    """Text generation through the HuggingFace inference API."""
+
+    def complete(self, prompt: str) -> str:
+        headers = {"Authorization": f"Bearer {os.getenv('GEMMA_TOKEN')}"}
+        data = {"inputs": prompt, "parameters": {"return_full_text": False}}
+
+        response = requests.post(
+            f"https://api-inference.huggingface.co/models/{self.model}",
+            headers=headers,
+            json=data,
+            timeout=self.timeout
+        )
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            raise RateLimitedError(response.text, retry_after=float(retry_after) if retry_after else None)
+        response.raise_for_status()
+
+        return response.json()[0]["generated_text"]
+
+
+class LocalStubBackend(LLMBackend):
+    """Offline backend returning a canned answer after a configurable latency, used for development and load tests."""
+
+    def __init__(self, latency: float = 0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    def complete(self, prompt: str) -> str:
+        time.sleep(self.latency)
+
+        return f"[{self.model}] Dies ist eine Testantwort ({len(prompt)} Zeichen Prompt)."
+
+
+BACKEND_TYPES = {
+    "groq": GroqBackend,
+    "huggingface": HuggingFaceBackend,
+    "stub": LocalStubBackend
+}
+
+
+def build_backend(backend_config: Dict) -> LLMBackend:
+    """
+    Creates a backend from one entry of the llm_backends configuration.
+
+    Args:
+        - backend_config (dict): Backend settings, specifically 'type', 'model', 'timeout', 'requests_per_minute' and optionally 'name', 'burst' and 'latency' (stub only).
+
+    Returns:
+        - LLMBackend: The configured backend.
+    """
+
+    settings = dict(backend_config)
+    backend_type = settings.pop("type")
+    settings.setdefault("name", backend_type)
+
+    if backend_type not in BACKEND_TYPES:
+        raise ValueError(f"Unknown LLM backend type: {backend_type}")
+
+    return BACKEND_TYPES[backend_type](**settings)
+
+
+class LLMRouter:
+    """
+    Sends prompts to an ordered list of backends with:
+        - retries with jittered exponential backoff per backend
+        - fallback to the next backend once a backend has failed
+        - a hedged request to the next backend when the current one exceeds its p95 latency
+    """
+
+    def __init__(self, backends: List[LLMBackend]):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend.")
+        self.backends = backends
+
+    def _call_with_retry(self, backend: LLMBackend, prompt: str, tenant_id: str, call: Dict) -> str:
+        last_error = None
+        bucket = backend.bucket(tenant_id)
+
+        for attempt in range(llm_max_retries + 1):
+            if attempt:
+                time.sleep(random.uniform(0, min(llm_backoff_max, llm_backoff_base * 2 ** attempt)))
+
+            # An exhausted bucket will not refill in time for a retry - fall back to the next backend right away
+            if not bucket.acquire(timeout=min(llm_rate_limit_wait, backend.timeout)):
+                raise RateLimitedError(f"Client-side rate limit of backend {backend.name} for tenant {tenant_id} exhausted.")
+
+            start = time.monotonic()
+            call.setdefault("started", start)
+            try:
+                answer = backend.complete(prompt)
+                backend.record_latency(time.monotonic() - start)
+                return answer
+            except RateLimitedError as e:
+                backend.pause(e.retry_after or llm_backoff_base * 2 ** (attempt + 1))
+                last_error = e
+            except Exception as e:
+                if not is_transient(e):
+                    logging.warning(f"LLM backend {backend.name} failed permanently: {e}")
+                    raise
+                last_error = e
+
+            logging.warning(f"LLM backend {backend.name} failed (attempt {attempt + 1}): {last_error}")
+
+        raise last_error
+
+    def _launch(self, backend: LLMBackend, prompt: str, tenant_id: str) -> Dict:
+        """
+        Starts a call to a backend on its own thread. Concurrency is bounded by the tenant query slots, not by a shared pool.
+
+        Args:
+            - backend (LLMBackend): The backend to call.
+            - prompt (str): The full prompt.
+            - tenant_id (str): The tenant whose rate limit share the call uses.
+
+        Returns:
+            - dict: The call with its 'future' and, once the backend call has actually started, its 'started' time.
+        """
+
+        call = {"future": Future(), "backend": backend}
+
+        def run():
+            try:
+                call["future"].set_result(self._call_with_retry(backend, prompt, tenant_id, call))
+            except BaseException as e:
+                call["future"].set_exception(e)
+
+        threading.Thread(target=run, name=f"llm-{backend.name}", daemon=True).start()
+
+        return call
+
+    def complete(self, prompt: str, tenant_id: str = default_tenant) -> str:
+        """
+        Generates an answer for a prompt using the first backend that succeeds.
+
+        Args:
+            - prompt (str): The full prompt.
+            - tenant_id (str, optional): The tenant the prompt is generated for. Default is default_tenant from config.
+
+        Returns:
+            - str: The generated answer.
+        """
+
+        pending = {}
+        errors = []
+        next_backend = 0
+        hedged = False
+        current = None
+
+        def launch():
+            nonlocal next_backend, current
+            current = self._launch(self.backends[next_backend], prompt, tenant_id)
+            pending[current["future"]] = current["backend"]
+            next_backend += 1
+
+        launch()
+
+        while pending:
+            timeout = None
+            hedge_delay = None
+            if not hedged and next_backend < len(self.backends):
+                hedge_delay = current["backend"].p95_latency() or llm_hedge_default_delay
+                # The hedge clock starts when the call reaches the backend, not while it waits for the rate limit
+                started = current.get("started")
+                timeout = HEDGE_START_POLL_INTERVAL if started is None else max(0.0, started + hedge_delay - time.monotonic())
+
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                started = current.get("started")
+                if started is not None and time.monotonic() - started >= hedge_delay:
+                    logging.info(f"LLM backend {current['backend'].name} exceeded {hedge_delay:.2f}s, hedging to {self.backends[next_backend].name}.")
+                    hedged = True
+                    launch()
+                continue
+
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    answer = future.result()
+                    logging.info(f"Answer generated by LLM backend {backend.name}.")
+                    return answer
+                except Exception as e:
+                    errors.append(f"{backend.name}: {e}")
+
+            # Fall back to the next backend once every running request has failed
+            if not pending and next_backend < len(self.backends):
+                launch()
+
+        raise LLMRouterError(f"All LLM backends failed: {'; '.join(errors)}")
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> LLMRouter:
+    """
+    Returns the process-wide router built from the llm_backends configuration.
+    """
+
+    global _router
+
+    with _router_lock:
+        if _router is None:
+            _router = LLMRouter([build_backend(backend_config) for backend_config in llm_backends])
+
+    return _router
+
+
+def set_backends(backends: List[LLMBackend]):
+    """
+    Replaces the process-wide router, e.g. with a LocalStubBackend for load tests.
+
+    Args:
+        - backends (List[LLMBackend]): The backends in fallback order.
+    """
+
+    global _router
+
+    with _router_lock:
+        _router = LLMRouter(backends)
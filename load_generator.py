@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from typing import List, Dict
+
+import faq_cache
+from config import default_tenant, faq_cache_directory
+from tenants import get_tenant
+from llm_router import LocalStubBackend, set_backends
+from coalescing import query_flight
+from session_retrieval import retrieval_stats, embed_query
+from gemma_groq_demo import query_groq_api, load_chroma_collection
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+)
+
+# Long-tail items residents ask about, combined with the templates below
+LONG_TAIL_ITEMS = [
+    "Pizzakartons", "Eierschalen", "Kaffeekapseln", "Tetrapaks", "Alufolie", "Zahnbürsten", "Katzenstreu",
+    "Spiegel", "Glühbirnen", "Energiesparlampen", "Styropor", "Joghurtbecher", "Zeitungen", "Windeln",
+    "Kerzenreste", "Asche", "Staubsaugerbeutel", "Teebeutel", "Korken", "alte Schuhe", "Altkleider",
+    "Medikamente", "Farbeimer", "Frittierfett", "Knochen", "Blumenerde", "Backpapier", "Kassenbons"
+]
+QUESTION_TEMPLATES = [
+    "Wohin mit {item}?",
+    "In welche Tonne gehören {item}?",
+    "Dürfen {item} in die Biotonne?",
+    "Wie entsorge ich {item} richtig?"
+]
+FOLLOW_UP_TEMPLATES = [
+    "Und was ist mit {item}?",
+    "Und {item}?",
+    "Gilt das auch für {item}?",
+    "Warum eigentlich?",
+    "Kannst du das genauer erklären?"
+]
+
+
+def current_rss_mb() -> float:
+    """
+    Returns the resident set size of the process in MB (current on Linux, peak elsewhere).
+    """
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def build_session(faq_questions: List[str], faq_share: float, max_turns: int) -> List[str]:
+    """
+    Builds the questions of one chat session: an opening FAQ or long-tail question followed by follow-ups.
+
+    Args:
+        - faq_questions (List[str]): The tenant's curated FAQ questions.
+        - faq_share (float): Probability that the session opens with an FAQ question.
+        - max_turns (int): Maximum number of turns of the session.
+
+    Returns:
+        - List[str]: The questions in the order they are asked.
+    """
+
+    if faq_questions and random.random() < faq_share:
+        questions = [random.choice(faq_questions)]
+    else:
+        questions = [random.choice(QUESTION_TEMPLATES).format(item=random.choice(LONG_TAIL_ITEMS))]
+
+    for _ in range(random.randint(0, max_turns - 1)):
+        questions.append(random.choice(FOLLOW_UP_TEMPLATES).format(item=random.choice(LONG_TAIL_ITEMS)))
+
+    return questions
+
+
+def percentile(values: List[float], share: float) -> float:
+    """
+    Returns the given percentile (share between 0 and 1) of a list of values, 0 for an empty list.
+    """
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def run_stage(tenant_id: str, workers: int, duration: float, think_time: float, faq_questions: List[str], faq_share: float, max_turns: int) -> Dict:
+    """
+    Runs one load stage: every worker replays chat sessions with a growing chat_history until the stage ends.
+
+    Args:
+        - tenant_id (str): The tenant to query.
+        - workers (int): Number of concurrent simulated users.
+        - duration (float): Duration of the stage in seconds.
+        - think_time (float): Mean pause between two turns of a user in seconds.
+        - faq_questions (List[str]): The tenant's curated FAQ questions.
+        - faq_share (float): Probability that a session opens with an FAQ question.
+        - max_turns (int): Maximum number of turns per session.
+
+    Returns:
+        - dict: Throughput, latency percentiles, error count, cache hit and session reuse rates, and the baseline memory and its peak increase per worker.
+    """
+
+    latencies, errors = [], []
+    results_lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    faq_before, flight_before, session_before = dict(faq_cache.lookup_stats), dict(query_flight.stats), dict(retrieval_stats)
+    rss_baseline = current_rss_mb()
+    rss_peak = rss_baseline
+    stage_done = threading.Event()
+
+    # The workers are threads of one process, so memory is sampled during the stage and its growth over the baseline is split across the workers
+    def sample_rss():
+        nonlocal rss_peak
+        while not stage_done.wait(0.1):
+            rss_peak = max(rss_peak, current_rss_mb())
+
+    def simulate_user():
+        while time.monotonic() < deadline:
+            chat_history, retrieval_state = [], {}
+            for question in build_session(faq_questions, faq_share, max_turns):
+                if time.monotonic() >= deadline:
+                    return
+                start = time.perf_counter()
+                try:
+                    answer, _ = query_groq_api(query=question, chat_history=list(chat_history), tenant_id=tenant_id, retrieval_state=retrieval_state)
+                    chat_history.append({"user": question, "chatbot": answer})
+                    with results_lock:
+                        latencies.append(time.perf_counter() - start)
+                except Exception as e:
+                    with results_lock:
+                        errors.append(str(e))
+                time.sleep(random.expovariate(1 / think_time) if think_time > 0 else 0)
+
+    threads = [threading.Thread(target=simulate_user, daemon=True) for _ in range(workers)]
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    stage_start = time.monotonic()
+    sampler.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - stage_start
+    stage_done.set()
+    sampler.join()
+
+    faq_hits = faq_cache.lookup_stats["hit"] - faq_before.get("hit", 0)
+    faq_lookups = faq_hits + faq_cache.lookup_stats["miss"] - faq_before.get("miss", 0)
+    coalesced = query_flight.stats["coalesced"] - flight_before.get("coalesced", 0)
+    flights = coalesced + query_flight.stats["leader"] - flight_before.get("leader", 0)
+    session_turns = {kind: retrieval_stats[kind] - session_before.get(kind, 0) for kind in ("reuse", "extend", "full")}
+    session_total = sum(session_turns.values())
+
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_p50": percentile(latencies, 0.50),
+        "latency_p90": percentile(latencies, 0.90),
+        "latency_p95": percentile(latencies, 0.95),
+        "latency_p99": percentile(latencies, 0.99),
+        "faq_hit_rate": faq_hits / faq_lookups if faq_lookups else 0.0,
+        "coalesced_rate": coalesced / flights if flights else 0.0,
+        "session_reuse_rate": session_turns["reuse"] / session_total if session_total else 0.0,
+        "session_extend_rate": session_turns["extend"] / session_total if session_total else 0.0,
+        "rss_baseline_mb": rss_baseline,
+        "rss_mb_per_worker": (max(rss_peak, current_rss_mb()) - rss_baseline) / workers,
+        "sample_errors": errors[:3]
+    }
+
+
+def print_report(results: List[Dict]):
+    """
+    Prints the results of the load stages as a table.
+    """
+
+    header = f"{'workers':>7} {'req':>6} {'err':>5} {'rps':>7} {'p50':>7} {'p90':>7} {'p95':>7} {'p99':>7} {'faq hit':>8} {'coalesc':>8} {'reuse':>7} {'extend':>7} {'base MB':>8} {'MB/wrk':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['workers']:>7} {r['requests']:>6} {r['errors']:>5} {r['throughput_rps']:>7.2f} "
+            f"{r['latency_p50']:>7.3f} {r['latency_p90']:>7.3f} {r['latency_p95']:>7.3f} {r['latency_p99']:>7.3f} "
+            f"{r['faq_hit_rate']:>8.1%} {r['coalesced_rate']:>8.1%} {r['session_reuse_rate']:>7.1%} {r['session_extend_rate']:>7.1%} {r['rss_baseline_mb']:>8.1f} {r['rss_mb_per_worker']:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay simulated German chat sessions against the query path with a stubbed LLM.")
+    parser.add_argument("--tenant", default=default_tenant, help="Tenant to query.")
+    parser.add_argument("--stages", default="1,2,4,8,16", help="Comma-separated numbers of concurrent users per stage.")
+    parser.add_argument("--stage-duration", type=float, default=30.0, help="Seconds per stage.")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Latency of the stubbed LLM in seconds.")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean pause between turns in seconds.")
+    parser.add_argument("--faq-share", type=float, default=0.6, help="Share of sessions opening with an FAQ question.")
+    parser.add_argument("--max-turns", type=int, default=5, help="Maximum turns per session.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible sessions.")
+    parser.add_argument("--output", default=None, help="Optional path of a JSON report.")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    # Traces of generated traffic must not end up in LangSmith
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    tenant = get_tenant(args.tenant)
+
+    with open(tenant["faq_questions_path"], encoding="utf-8") as f:
+        faq_questions = json.load(f)
+
+    # Stub LLM without rate limit, so the measurement covers our own stack only
+    set_backends([LocalStubBackend(latency=args.llm_latency, name="stub", model="stub", timeout=60, requests_per_minute=10 ** 6, burst=10 ** 6)])
+
+    # Work on a copy of the tenant's FAQ cache so the load test never writes to the live cache
+    tmp_directory = tempfile.mkdtemp(prefix="loadtest_")
+    cache_file = os.path.join(faq_cache_directory, f"faq_cache_{args.tenant}.sqlite3")
+    if os.path.isfile(cache_file):
+        shutil.copy(cache_file, tmp_directory)
+    faq_cache.faq_cache_directory = tmp_directory
+
+    # Load the embedding model and the collection before measuring, so they are part of the baseline and not of the first stage's per-worker memory
+    embed_query("Wohin mit dem Müll?")
+    load_chroma_collection(name=tenant["collection_base_name"])
+
+    results = []
+    try:
+        for workers in [int(stage) for stage in args.stages.split(",")]:
+            result = run_stage(args.tenant, workers, args.stage_duration, args.think_time, faq_questions, args.faq_share, args.max_turns)
+            results.append(result)
+            print(f"Stage with {workers} users: {result['requests']} requests, p95 {result['latency_p95']:.3f}s, {result['errors']} errors")
+    finally:
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+
+    print()
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "stages": results}, f, indent=2)
@@ -1,10 +1,18 @@
 import os
+import json
+import hashlib
 import logging
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 from langchain_community.document_loaders import PyPDFLoader
+from langchain.schema import Document
 
-from config import document_directory
+from config import extraction_cache_directory, pdf_extraction_mode
+
+try:
+    import pdfplumber
+except ImportError:  # optional - only needed for the layout extraction mode
+    pdfplumber = None
 
 # Configure logging
 logging.basicConfig(
@@ -38,10 +46,349 @@ def correct_ger_umlauts(text: str) -> str:
     return text
 
 
-def preprocess_docs(documents: List[Dict[str,str]], root_dir: str) -> List:
+# Bump a version whenever its extractor output changes to invalidate the extraction cache
+EXTRACTOR_VERSIONS = {
+    "plain": "pypdf-1",
+    "layout": "pdfplumber-layout-2"
+}
+
+
+def hash_file(path: str) -> str:
+    """
+    Computes the SHA-256 hash of a file.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        str: The hex digest of the file content.
+    """
+
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+
+    return sha256.hexdigest()
+
+
+def extraction_cache_path(pdf_hash: str, extractor_version: str) -> str:
+    """
+    Returns the path of the extraction cache entry of a PDF for an extractor version.
+    """
+
+    return os.path.join(extraction_cache_directory, f"{pdf_hash}_{extractor_version}.json")
+
+
+def load_cached_pages(pdf_hash: str, extractor_version: str) -> Optional[List[Document]]:
+    """
+    Loads the extracted pages of a PDF from the extraction cache.
+
+    Args:
+        pdf_hash (str): The hash of the PDF file.
+        extractor_version (str): The version of the extractor that produced the pages.
+
+    Returns:
+        list or None: The cached pages, or None if the PDF was not extracted with this extractor version yet.
+    """
+
+    path = extraction_cache_path(pdf_hash, extractor_version)
+    if not os.path.isfile(path):
+        return None
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            pages = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable extraction cache entry {path}: {e}")
+        return None
+
+    return [Document(page_content=page["page_content"], metadata=page["metadata"]) for page in pages]
+
+
+def store_cached_pages(pdf_hash: str, extractor_version: str, pages: List[Document]):
+    """
+    Stores the extracted pages of a PDF in the extraction cache.
+
+    Args:
+        pdf_hash (str): The hash of the PDF file.
+        extractor_version (str): The version of the extractor that produced the pages.
+        pages (list): The extracted pages.
+    """
+
+    os.makedirs(extraction_cache_directory, exist_ok=True)
+    path = extraction_cache_path(pdf_hash, extractor_version)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump([{"page_content": page.page_content, "metadata": page.metadata} for page in pages], f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def format_table(rows: List[List[Optional[str]]]) -> str:
+    """
+    Converts an extracted table into structured text rows. If the first row is a header, each cell is prefixed
+    with its column name (e.g. "Biotonne: Obstreste; Restmüll: Windeln"), otherwise cells are joined by " | ".
+
+    Args:
+        rows (list of list): The table cells as returned by pdfplumber, None for empty cells.
+
+    Returns:
+        str: One line per table row.
+    """
+
+    rows = [[" ".join((cell or "").split()) for cell in row] for row in rows]
+    rows = [row for row in rows if any(row)]
+    if not rows:
+        return ""
+
+    header = rows[0]
+    if len(rows) > 1 and all(header):
+        lines = [
+            "; ".join(f"{name}: {cell}" for name, cell in zip(header, row) if cell)
+            for row in rows[1:]
+        ]
+    else:
+        lines = [" | ".join(cell for cell in row if cell) for row in rows]
+
+    return "\n".join(line for line in lines if line)
+
+
+def find_column_bounds(words: List[Dict], page_width: float, min_gutter: float = 15) -> List[tuple]:
+    """
+    Detects text columns from empty vertical gutters between the words of a page.
+
+    Args:
+        words (list of dict): Words with x0/x1 coordinates as returned by pdfplumber.
+        page_width (float): The width of the page.
+        min_gutter (float, optional): Minimum gutter width in points. Default is 15.
+
+    Returns:
+        list of tuple: The (x0, x1) bounds of each column from left to right.
+    """
+
+    if not words:
+        return [(0, page_width)]
+
+    # Mark every horizontal point covered by a word - words may reach past the page edge
+    covered = [False] * (int(page_width) + 1)
+    for word in words:
+        for x in range(max(0, int(word["x0"])), min(len(covered), int(word["x1"]) + 1)):
+            covered[x] = True
+
+    left = min(len(covered) - 1, max(0, min(int(word["x0"]) for word in words)))
+    right = min(len(covered) - 1, max(0, max(int(word["x1"]) for word in words)))
+    bounds = []
+    start, gap_start = left, None
+
+    for x in range(left, right + 1):
+        if not covered[x] and gap_start is None:
+            gap_start = x
+        elif covered[x] and gap_start is not None:
+            if x - gap_start >= min_gutter:
+                bounds.append((start, gap_start))
+                start = x
+            gap_start = None
+    bounds.append((start, right + 1))
+
+    return bounds
+
+
+def group_lines(words: List[Dict], tolerance: float = 3) -> List[List[Dict]]:
+    """
+    Groups words into text lines by their vertical position.
+
+    Args:
+        words (list of dict): Words with top/bottom coordinates as returned by pdfplumber.
+        tolerance (float, optional): Maximum difference of the top coordinate within a line in points. Default is 3.
+
+    Returns:
+        list of list: The lines from top to bottom.
+    """
+
+    lines = []
+    for word in sorted(words, key=lambda word: (word["top"], word["x0"])):
+        if lines and abs(word["top"] - lines[-1][0]["top"]) <= tolerance:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+
+    return lines
+
+
+def find_gutters(lines: List[List[Dict]], page_width: float, min_gutter: float = 15, max_bridging_share: float = 0.2) -> List[tuple]:
+    """
+    Detects column gutters over a whole block of lines instead of line by line, so columns whose baselines are
+    offset (different leading or font sizes) are still recognized. A gutter is a horizontal range between text
+    that at most max_bridging_share of the lines cross, e.g. a full-width title or footer.
+
+    Args:
+        lines (list of list): The lines of the block as returned by group_lines.
+        page_width (float): The width of the page.
+        min_gutter (float, optional): Minimum gutter width in points. Default is 15.
+        max_bridging_share (float, optional): Maximum share of lines crossing a gutter. Default is 0.2.
+
+    Returns:
+        list of tuple: The (x0, x1) ranges of the gutters from left to right.
+    """
+
+    # Count the lines covering every horizontal point, following the gaps within each line
+    counts = [0] * (int(page_width) + 1)
+    for line in lines:
+        for x0, x1 in find_column_bounds(line, page_width, min_gutter):
+            for x in range(max(0, int(x0)), min(len(counts), int(x1))):
+                counts[x] += 1
+
+    threshold = max_bridging_share * len(lines)
+    text = [x for x, count in enumerate(counts) if count > threshold]
+    if not text:
+        return []
+
+    gutters = []
+    gap_start = None
+    for x in range(text[0], text[-1] + 1):
+        if counts[x] <= threshold and gap_start is None:
+            gap_start = x
+        elif counts[x] > threshold and gap_start is not None:
+            if x - gap_start >= min_gutter:
+                gutters.append((gap_start, x))
+            gap_start = None
+
+    return gutters
+
+
+def find_bands(words: List[Dict], page_width: float) -> List[tuple]:
+    """
+    Splits a page into horizontal bands of consistent column layout. The gutters are detected over the whole page
+    first (find_gutters); lines reaching across at least half of a gutter, like a full-width title or footer, form
+    bands of their own and split the multi-column text into blocks that are read column by column.
+
+    Args:
+        words (list of dict): Words as returned by pdfplumber.
+        page_width (float): The width of the page.
+
+    Returns:
+        list of tuple: The words and the (x0, x1) column bounds of each band from top to bottom.
+    """
+
+    lines = group_lines(words)
+    gutters = find_gutters(lines, page_width)
+
+    def spans_gutter(line):
+        return any(
+            min(x1, gutter_x1) - max(x0, gutter_x0) >= (gutter_x1 - gutter_x0) / 2
+            for x0, x1 in find_column_bounds(line, page_width)
+            for gutter_x0, gutter_x1 in gutters
+        )
+
+    # Multi-column blocks are split in the middle of every gutter, so slightly ragged lines stay in their column
+    edges = [0] + [(gutter_x0 + gutter_x1) / 2 for gutter_x0, gutter_x1 in gutters] + [page_width]
+    block_columns = list(zip(edges, edges[1:]))
+
+    bands = []
+    band_spanning = None
+
+    for line in lines:
+        spanning = spans_gutter(line)
+        if bands and spanning == band_spanning:
+            bands[-1][0].extend(line)
+        else:
+            bands.append((list(line), [(0, page_width)] if spanning else block_columns))
+            band_spanning = spanning
+
+    return bands
+
+
+def extract_layout_pages(pdf_path: str) -> List[Document]:
+    """
+    Extracts the pages of a PDF with layout analysis:
+        - tables are recovered into structured rows
+        - remaining text is read band by band, and within a band column by column instead of across columns
+
+    Args:
+        pdf_path (str): The path of the PDF file.
+
+    Returns:
+        list: One document per page with "source" and "page" metadata like PyPDFLoader.
+    """
+
+    pages = []
+
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_number, page in enumerate(pdf.pages):
+            tables = page.find_tables()
+            table_boxes = [table.bbox for table in tables]
+
+            def outside_tables(obj):
+                if obj.get("object_type") != "char":
+                    return True
+                x, y = (obj["x0"] + obj["x1"]) / 2, (obj["top"] + obj["bottom"]) / 2
+                return not any(x0 <= x <= x1 and top <= y <= bottom for x0, top, x1, bottom in table_boxes)
+
+            text_page = page.filter(outside_tables)
+            words = text_page.extract_words()
+
+            parts = []
+            for band, columns in find_bands(words, page.width):
+                top = max(0, min(word["top"] for word in band) - 1)
+                bottom = min(page.height, max(word["bottom"] for word in band) + 1)
+                for x0, x1 in columns:
+                    column_text = text_page.crop((max(0, x0), top, min(page.width, x1), bottom)).extract_text() or ""
+                    if column_text.strip():
+                        parts.append(column_text.strip())
+            for table in tables:
+                table_text = format_table(table.extract())
+                if table_text:
+                    parts.append(table_text)
+
+            pages.append(Document(page_content="\n\n".join(parts), metadata={"source": pdf_path, "page": page_number}))
+
+    return pages
+
+
+def extract_pages(pdf_path: str, mode: str) -> List[Document]:
+    """
+    Extracts the pages of a PDF, reusing the extraction cache keyed by PDF hash and extractor version.
+
+    Args:
+        pdf_path (str): The path of the PDF file.
+        mode (str): "plain" for PyPDFLoader text extraction or "layout" for table- and column-aware extraction.
+
+    Returns:
+        list: One document per page.
+    """
+
+    if mode == "layout" and pdfplumber is None:
+        logging.warning("pdfplumber is not installed, falling back to plain text extraction.")
+        mode = "plain"
+    if mode not in EXTRACTOR_VERSIONS:
+        raise ValueError(f"Unknown extraction mode: {mode}")
+
+    extractor_version = EXTRACTOR_VERSIONS[mode]
+    pdf_hash = hash_file(pdf_path)
+
+    pages = load_cached_pages(pdf_hash, extractor_version)
+    if pages is not None:
+        logging.info(f"Loaded {len(pages)} pages of {os.path.basename(pdf_path)} from extraction cache.")
+        for page in pages:
+            page.metadata["source"] = pdf_path
+        return pages
+
+    if mode == "layout":
+        pages = extract_layout_pages(pdf_path)
+    else:
+        # PyPDFLoader separates a document by page - access extracted text (page_content) or metadata (metadata)
+        pages = PyPDFLoader(pdf_path).load()
+
+    store_cached_pages(pdf_hash, extractor_version, pages)
+
+    return pages
+
+
+def preprocess_docs(documents: List[Dict[str,str]], root_dir: str, mode: str = pdf_extraction_mode) -> List:
     """
     Processes a list of PDF documents by:
-        - splitting into pages
+        - splitting into pages (cached per PDF hash and extractor version)
         - correcting text encoding errors
         - adds metadata attributes (document_name, category)
         - filters by documents with > 10 words
@@ -50,9 +397,12 @@ def preprocess_docs(documents: List[Dict[str,str]], root_dir: str) -> List:
         - documents (list of dict): A list of dictionaries where each dictionary contains information about a document, specifically:
             - 'document_name': The name of the document file (str).
             - 'category': The category to be assigned to each document (str).
+            - 'requires_layout' (optional): True for documents whose plain text extraction is unusable (e.g. tables); they are skipped without layout extraction (bool).
 
         - root_dir (str): The root directory where the PDF documents are stored.
 
+        - mode (str, optional): "plain" or "layout" extraction, see extract_pages. Default is pdf_extraction_mode from config.
+
     Returns:
         list: A list of processed documents with added metadata and corrected text.
     """
@@ -65,16 +415,18 @@ def preprocess_docs(documents: List[Dict[str,str]], root_dir: str) -> List:
     preprocessed_docs = []
 
     for doc_info in documents:
-        pdf_path = os.path.join(document_directory, doc_info["document_name"])
+        pdf_path = os.path.join(root_dir, doc_info["document_name"])
         
         if not os.path.isfile(pdf_path):
             logging.warning(f"File not found: {pdf_path}. Skipping document.")
             continue
 
+        if doc_info.get("requires_layout") and (mode != "layout" or pdfplumber is None):
+            logging.error(f"{doc_info['document_name']} requires layout extraction (mode 'layout' with pdfplumber installed). Skipping document.")
+            continue
+
         try:
-            # PyPDFLoader separates a document by page - access extracted text (page_content) or metadata (metadata)
-            loader = PyPDFLoader(pdf_path)
-            docs = loader.load()
+            docs = extract_pages(pdf_path, mode=mode)
 
             valid_docs = []
 
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import functools
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Optional
+
+from config import profiling_toggle_path, profiling_threshold, profiling_interval, profiling_output_directory
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+)
+
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+
+def profiling_enabled() -> bool:
+    """
+    Checks whether request profiling is switched on. It is toggled at runtime, without restarting the app,
+    by creating or deleting the file at profiling_toggle_path.
+
+    Returns:
+        - bool: True if requests should be profiled.
+    """
+
+    return os.path.exists(profiling_toggle_path)
+
+
+def set_profiling(enabled: bool):
+    """
+    Switches request profiling on or off for all running processes.
+
+    Args:
+        - enabled (bool): Whether requests should be profiled.
+    """
+
+    if enabled:
+        open(profiling_toggle_path, "a").close()
+    elif os.path.exists(profiling_toggle_path):
+        os.remove(profiling_toggle_path)
+
+    logging.info(f"Request profiling {'enabled' if enabled else 'disabled'}.")
+
+
+class SamplingProfiler:
+    """
+    Periodically samples the Python stack of one thread and counts the collapsed stacks, the input format of flamegraph tools.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            names = []
+            while frame is not None:
+                names.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+class RequestProfile:
+    """
+    Wall-clock stage breakdown and stack samples of one profiled request.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.stages = []
+        self.profiler = SamplingProfiler(threading.get_ident(), profiling_interval)
+
+    def write(self, elapsed: float) -> str:
+        """
+        Writes the collapsed stacks (<name>.folded, for flamegraph.pl or speedscope) and the stage breakdown (<name>.json).
+
+        Args:
+            - elapsed (float): Total duration of the request in seconds.
+
+        Returns:
+            - str: The path of the written files without extension.
+        """
+
+        os.makedirs(profiling_output_directory, exist_ok=True)
+        path = os.path.join(profiling_output_directory, f"{self.started_at.strftime('%Y%m%d_%H%M%S_%f')}_{self.name}_{int(elapsed * 1000)}ms")
+
+        with open(f"{path}.folded", "w", encoding="utf-8") as f:
+            for stack, count in self.profiler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        with open(f"{path}.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "name": self.name,
+                "started_at": self.started_at.isoformat(),
+                "elapsed": elapsed,
+                "samples": sum(self.profiler.stacks.values()),
+                "sampling_interval": profiling_interval,
+                "stages": self.stages
+            }, f, indent=2)
+
+        return path
+
+
+@contextmanager
+def profile_request(name: str, force: bool = False, threshold: Optional[float] = None):
+    """
+    Samples the current thread while the block runs and writes the profile if the block took longer than the threshold.
+    Nested calls inside an already profiled request are included in the outer profile.
+
+    Args:
+        - name (str): Name of the profiled request, used in the file names.
+        - force (bool, optional): Profile even if profiling is switched off. Default is False.
+        - threshold (float, optional): Minimum duration in seconds to write the profile. Default is profiling_threshold.
+    """
+
+    if _current_profile.get() is not None or not (force or profiling_enabled()):
+        yield
+        return
+
+    profile = RequestProfile(name)
+    token = _current_profile.set(profile)
+    profile.profiler.start()
+
+    try:
+        yield
+    finally:
+        profile.profiler.stop()
+        _current_profile.reset(token)
+        elapsed = time.perf_counter() - profile.start
+
+        if elapsed >= (profiling_threshold if threshold is None else threshold):
+            try:
+                path = profile.write(elapsed)
+                logging.warning(f"Slow request {name} took {elapsed:.2f}s, profile written to {path}.folded")
+            except OSError as e:
+                logging.error(f"Error writing profile of {name}: {e}")
+
+
+def profiled(name: str) -> Callable:
+    """
+    Decorator running a function inside profile_request.
+
+    Args:
+        - name (str): Name of the profiled request.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with profile_request(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Records the wall-clock duration of a stage (e.g. retrieval, llm) in the current request profile. Does nothing
+    outside a profiled request.
+
+    Args:
+        - name (str): Name of the stage.
+    """
+
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.stages.append({
+            "stage": name,
+            "offset": start - profile.start,
+            "duration": time.perf_counter() - start
+        })
@@ -0,0 +1,123 @@
+import re
+import math
+import logging
+import threading
+from collections import Counter
+from typing import List, Dict, Optional
+
+from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+)
+
+# Openings of follow-up questions that only make sense together with the previous turn
+FOLLOW_UP_PATTERN = re.compile(r"^\s*(und|aber|auch|oder|was ist mit|wie ist es mit|wie sieht es mit|gilt das|and|what about|how about)\b", re.IGNORECASE)
+REFERENCE_WORDS = {"das", "dies", "diese", "dieser", "dieses", "es", "dafür", "davon", "dazu", "dort", "that", "it", "this", "those"}
+
+_embedding_function = None
+_embedding_lock = threading.Lock()
+
+# How session turns were retrieved in this process ("reuse", "extend" or "full"), e.g. for load test reports
+retrieval_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def embed_query(text: str) -> List[float]:
+    """
+    Embeds a query with Chroma's default embedding function, the one collections without an explicit function use for query_texts.
+
+    Args:
+        - text (str): The query to embed.
+
+    Returns:
+        - List[float]: The query vector.
+    """
+
+    global _embedding_function
+
+    with _embedding_lock:
+        if _embedding_function is None:
+            _embedding_function = DefaultEmbeddingFunction()
+
+    return [float(value) for value in _embedding_function([text])[0]]
+
+
+def cosine_similarity(first: List[float], second: List[float]) -> float:
+    """
+    Computes the cosine similarity of two vectors.
+    """
+
+    dot = sum(a * b for a, b in zip(first, second))
+    norm = math.sqrt(sum(a * a for a in first)) * math.sqrt(sum(b * b for b in second))
+
+    return dot / norm if norm else 0.0
+
+
+def is_follow_up(query: str) -> bool:
+    """
+    Detects follow-up questions like "und was ist mit Glas?" that depend on the previous turns, by their opening or a reference word.
+    Short standalone questions like "Wohin mit Batterien?" are not follow-ups; if a condensed query still drifts, the topic similarity check decides.
+
+    Args:
+        - query (str): The user's question.
+
+    Returns:
+        - bool: True if the question should be read together with the recent history.
+    """
+
+    words = set(re.findall(r"[a-zA-ZäöüÄÖÜß]+", query.lower()))
+
+    return bool(FOLLOW_UP_PATTERN.match(query)) or bool(words & REFERENCE_WORDS)
+
+
+def count_retrieval(kind: str):
+    """
+    Counts how a session turn was retrieved.
+
+    Args:
+        - kind (str): "reuse", "extend" or "full".
+    """
+
+    with _stats_lock:
+        retrieval_stats[kind] += 1
+
+
+def condense_query(query: str, chat_history: List[Dict[str, str]], max_history_turns: int = 2) -> str:
+    """
+    Turns a follow-up question into a standalone retrieval query by prefixing the recent user questions, without an LLM call.
+
+    Args:
+        - query (str): The user's question.
+        - chat_history (list of dict): The conversation history with "user" and "chatbot" entries.
+        - max_history_turns (int, optional): Number of previous user questions to include. Default is 2.
+
+    Returns:
+        - str: The standalone query, or the question itself if it is not a follow-up.
+    """
+
+    if not chat_history or not is_follow_up(query):
+        return query
+
+    history = " ".join(entry["user"] for entry in chat_history[-max_history_turns:])
+
+    return f"{history} {query}"
+
+
+def remember_turn(retrieval_state: Dict, query: str, vector: Optional[List[float]], passages: List[str], max_turns: int):
+    """
+    Stores the retrieval of a turn in the session's retrieval state, keeping only the most recent turns.
+
+    Args:
+        - retrieval_state (dict): The per-session state, e.g. kept in st.session_state.
+        - query (str): The standalone query of the turn.
+        - vector (List[float] or None): The query vector, or None to embed the query only when a later turn compares against it.
+        - passages (List[str]): The passages used for the turn.
+        - max_turns (int): Number of turns to keep.
+    """
+
+    turns = retrieval_state.setdefault("turns", [])
+    turns.append({"query": query, "vector": vector, "passages": list(passages)})
+    del turns[:-max_turns]
@@ -0,0 +1,65 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+from config import tenants, tenant_queue_timeout
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+)
+
+_query_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_semaphores_lock = threading.Lock()
+
+
+class TenantBusyError(Exception):
+    """Raised when a tenant has used up its concurrency quota for longer than tenant_queue_timeout."""
+
+
+def get_tenant(tenant_id: str) -> Dict:
+    """
+    Returns the configuration of a tenant.
+
+    Args:
+        - tenant_id (str): The tenant identifier, e.g. "frankfurt".
+
+    Returns:
+        - dict: The tenant configuration from config.tenants.
+    """
+
+    if tenant_id not in tenants:
+        logging.error(f"Unknown tenant: {tenant_id}")
+        raise ValueError(f"Unknown tenant: {tenant_id}")
+
+    return tenants[tenant_id]
+
+
+@contextmanager
+def query_slot(tenant_id: str):
+    """
+    Holds one of the tenant's concurrent query slots (max_concurrent_queries), so a traffic spike of one tenant
+    queues within its own quota instead of occupying the LLM and Chroma capacity of all tenants.
+
+    Args:
+        - tenant_id (str): The tenant identifier.
+
+    Raises:
+        - TenantBusyError: If no slot became available within tenant_queue_timeout seconds.
+    """
+
+    with _semaphores_lock:
+        semaphore = _query_semaphores.get(tenant_id)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(get_tenant(tenant_id)["max_concurrent_queries"])
+            _query_semaphores[tenant_id] = semaphore
+
+    if not semaphore.acquire(timeout=tenant_queue_timeout):
+        raise TenantBusyError(f"Too many concurrent requests for tenant {tenant_id}.")
+
+    try:
+        yield
+    finally:
+        semaphore.release()
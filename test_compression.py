@@ -0,0 +1,43 @@
+from compression import compress_context, split_units
+
+
+def test_inflected_forms_keep_lower_ranked_passages():
+    passages = [
+        "Restmüll kommt in die graue Tonne.",
+        "Küchenabfälle wie Obst- und Gemüsereste gehören in die Biotonne."
+    ]
+
+    compressed = compress_context("Was mache ich mit Gemüseresten?", passages)
+
+    assert passages[1] in compressed
+
+
+def test_abbreviations_keep_the_passage_whole():
+    passages = [
+        "Restmüll kommt in die graue Tonne.",
+        "Küchenabfälle, z. B. Obst- und Gemüsereste, gehören in die Biotonne."
+    ]
+
+    compressed = compress_context("Was mache ich mit Gemüseresten?", passages)
+
+    assert passages[1] in compressed
+
+
+def test_abbreviations_do_not_split_sentences():
+    units = split_units("Küchenabfälle, z. B. Obst, bzw. Gemüse. Infos ca. 3 Tage vorher, Tel.: 069 212 bei der Str. 5.")
+
+    assert units == ["Küchenabfälle, z. B. Obst, bzw. Gemüse.", "Infos ca. 3 Tage vorher, Tel.: 069 212 bei der Str. 5."]
+
+
+def test_every_passage_keeps_its_best_unit():
+    passages = ["Glas kommt in den Glascontainer.", "Die Abfuhr ist montags. Sperrmüll bitte anmelden."]
+
+    compressed = compress_context("Wohin mit Glas?", passages)
+
+    assert len(compressed) == 2
+
+
+def test_bullet_lists_stay_with_their_heading():
+    units = split_units("Das darf hinein: • Obst • Kaffeesatz. Das darf nicht hinein: • Plastik")
+
+    assert units == ["Das darf hinein: • Obst • Kaffeesatz.", "Das darf nicht hinein: • Plastik"]
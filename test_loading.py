@@ -0,0 +1,66 @@
+from loading import find_bands, find_column_bounds
+
+
+def make_line(text, x0, top, size=10):
+    """Builds pdfplumber-like words of one line starting at x0."""
+    words, x = [], x0
+    for token in text.split():
+        width = len(token) * size * 0.5
+        words.append({"text": token, "x0": x, "x1": x + width, "top": top, "bottom": top + size})
+        x += width + size * 0.3
+    return words
+
+
+def band_texts(bands):
+    """Reads every band column by column like extract_layout_pages."""
+    texts = []
+    for band, columns in bands:
+        for x0, x1 in columns:
+            column = [word for word in band if x0 <= word["x0"] < x1]
+            if column:
+                texts.append(" ".join(word["text"] for word in sorted(column, key=lambda word: (word["top"], word["x0"]))))
+    return texts
+
+
+def test_column_bounds_are_clamped_to_the_page():
+    assert find_column_bounds([{"x0": 10, "x1": 600.5}], 595) == [(10, 596)]
+
+
+def test_offset_baselines_are_read_column_by_column():
+    # Two columns whose baselines differ by 6pt, between a full-width title and footer
+    words = make_line("Was kommt in welche Tonne und wohin mit dem Rest", 40, 20)
+    for i in range(6):
+        words += make_line(f"links{i} aaa bbb ccc", 40, 60 + 14 * i)
+        words += make_line(f"rechts{i} ddd eee fff", 320, 66 + 14 * i, size=9)
+    words += make_line("FES Frankfurter Entsorgungs- und Service GmbH Telefon 0800", 40, 180)
+
+    texts = band_texts(find_bands(words, 595))
+
+    assert len(texts) == 4
+
+    assert texts[0].startswith("Was kommt")
+    assert texts[1] == " ".join(f"links{i} aaa bbb ccc" for i in range(6))
+    assert texts[2] == " ".join(f"rechts{i} ddd eee fff" for i in range(6))
+    assert texts[3].startswith("FES")
+
+
+def test_single_column_text_stays_one_band():
+    words = []
+    for i in range(5):
+        words += make_line(f"Zeile{i} mit normalem Fließtext über die ganze Breite der Seite", 40, 20 + 14 * i)
+
+    bands = find_bands(words, 595)
+
+    assert len(bands) == 1
+    assert bands[0][1] == [(0, 595)]
+
+
+def test_offset_baselines_without_title_are_not_interleaved():
+    words = []
+    for i in range(4):
+        words += make_line(f"L{i} aaa bbb", 40, 60 + 12 * i)
+        words += make_line(f"R{i} ccc ddd", 320, 66 + 12 * i)
+
+    texts = band_texts(find_bands(words, 595))
+
+    assert texts == ["L0 aaa bbb L1 aaa bbb L2 aaa bbb L3 aaa bbb", "R0 ccc ddd R1 ccc ddd R2 ccc ddd R3 ccc ddd"]